@@ -1,6 +1,8 @@
 import json
+import time
 from typing import Literal
 
+import httpx
 from langchain.chat_models import init_chat_model
 from langchain.schema import SystemMessage
 from langchain_core.messages import convert_to_openai_messages
@@ -8,7 +10,8 @@ from langchain_core.runnables import RunnableConfig
 from langgraph.constants import START, END
 from langgraph.graph import StateGraph
 from langgraph.graph.message import AnyMessage, add_messages
-from openai import AsyncOpenAI
+from mcp.shared.exceptions import McpError
+from openai import APITimeoutError, AsyncOpenAI
 from pydantic import BaseModel
 from tabulate import tabulate
 from typing_extensions import Annotated, TypedDict
@@ -17,6 +20,13 @@ from mcp_http_client import MCPHTTPCLIENT
 
 model_id = 'nvidia/llama-3.3-nemotron-super-49b-v1'
 
+# Seconds a store_agent turn (LLM call plus tool call) may take, unless configured with `timeout_s`
+DEFAULT_TIMEOUT_S = 60.0
+
+# Tools that change the database: never cut short, since one that commits after we stopped waiting
+# would be reported as failed and a retry would then find nothing left to refund
+WRITE_TOOLS = {"invoice_refund", "invoice_refund_bulk"}
+
 
 class State(TypedDict):
     """Agent state."""
@@ -59,6 +69,18 @@ async def store_agent(state: State, config: RunnableConfig):
     mcp_server_url = config.get("configurable", {}).get("mcp_server_url")
     inf_url = config.get("configurable", {}).get("inf_url")
     nvidia_api_key = config.get("configurable", {}).get("nvidia_api_key")
+    timeout_s = config.get("configurable", {}).get("timeout_s", DEFAULT_TIMEOUT_S)
+    # One deadline for the whole turn. The LLM call and the tool call share it, and the invoice server
+    # is sent what is left of it, so it stops working on the call once nobody is waiting for it.
+    # Refunds are the exception: see WRITE_TOOLS.
+    deadline = time.monotonic() + timeout_s
+
+    def remaining() -> float:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise TimeoutError(f"store_agent exceeded its {timeout_s}s deadline")
+        return left
+
     openAI_client = AsyncOpenAI(
         base_url=inf_url,
         api_key=nvidia_api_key
@@ -68,8 +90,30 @@ async def store_agent(state: State, config: RunnableConfig):
     messages = convert_to_openai_messages([system_message, *state['messages']])
 
     mcp_client = MCPHTTPCLIENT(mcp_server_url)
-    await mcp_client.connect()
+    try:
+        await mcp_client.connect()
+        output = await _store_agent_turn(mcp_client, openAI_client, messages, remaining)
+    except (TimeoutError, APITimeoutError):
+        output = _timed_out()
+    except McpError as e:
+        if e.error.code != httpx.codes.REQUEST_TIMEOUT:
+            raise
+        output = _timed_out()
+    finally:
+        await mcp_client.cleanup()
+
+    return output
+
 
+def _timed_out() -> dict:
+    content = "Sorry, that is taking longer than expected. Could you please try again?"
+    return {
+        "messages": [{"role": "assistant", "content": content}],
+        "followup": content,
+    }
+
+
+async def _store_agent_turn(mcp_client: MCPHTTPCLIENT, openAI_client: AsyncOpenAI, messages, remaining) -> dict:
     # List tools available in the Stdio MCP Server
     res_tools = await mcp_client.session.list_tools()
 
@@ -89,7 +133,8 @@ async def store_agent(state: State, config: RunnableConfig):
         messages=messages,
         tools=available_tools,
         tool_choice="auto",
-        stream=False
+        stream=False,
+        timeout=remaining(),
     )
 
     stop_reason = (
@@ -111,7 +156,11 @@ async def store_agent(state: State, config: RunnableConfig):
                 if isinstance(tool_call.function.arguments, str)
                 else tool_call.function.arguments
             )
-            tool_result = await mcp_client.session.call_tool(tool_name, arguments)
+            # A refund is not started once the deadline has passed, but once started it runs to completion
+            timeout = remaining()
+            if tool_name in WRITE_TOOLS:
+                timeout = None
+            tool_result = await mcp_client.call_tool(tool_name, arguments, timeout=timeout)
             result = tool_result.content[0].text
             tool_message = {
                 "role": "tool",
@@ -119,7 +168,14 @@ async def store_agent(state: State, config: RunnableConfig):
                 "content": result
             }
 
-            if tool_name == 'invoice_refund':
+            if tool_result.isError:
+                # e.g. the server cancelled the call when the deadline passed
+                content = "Sorry, I could not complete that request. Could you please try again?"
+                output = {
+                    "messages": [tool_message, {"role": "assistant", "content": content}],
+                    "followup": content,
+                }
+            elif tool_name == 'invoice_refund':
                 content = f"You have been refunded a total of: ${result}. Is there anything else I can help with?"
                 followup = content
                 output = {
@@ -161,8 +217,6 @@ async def store_agent(state: State, config: RunnableConfig):
             "messages": [{"role": "assistant", "content": f"unknown error with stop reason {stop_reason}"}]
         }
 
-    await mcp_client.cleanup()
-
     return output
 
 
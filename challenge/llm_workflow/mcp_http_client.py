@@ -1,8 +1,13 @@
 from contextlib import AsyncExitStack
+from datetime import timedelta
 
+import mcp.types as types
 from mcp import ClientSession
 from mcp.client.streamable_http import streamablehttp_client
 
+# Request `_meta` field telling the server how many milliseconds the call may take
+TIMEOUT_META_KEY = "timeoutMs"
+
 
 class MCPHTTPCLIENT:
     def __init__(self, url):
@@ -10,7 +15,6 @@ class MCPHTTPCLIENT:
         ## initialize any required class variables
         self.exit_stack = AsyncExitStack()
         self.session = None
-        self._client = None
         self.url = url
 
     async def __aenter__(self):
@@ -18,18 +22,31 @@ class MCPHTTPCLIENT:
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.__aexit__(exc_type, exc_val, exc_tb)
-        if self._client:
-            await self._client.__aexit__(exc_type, exc_val, exc_tb)
+        await self.cleanup()
 
     async def connect(self):
-        self._client = streamablehttp_client(self.url)
-        self._receive, self._send, self._transport = await self._client.__aenter__()
-        session = ClientSession(self._receive, self._send)
-        self.session = await session.__aenter__()
+        self._receive, self._send, self._transport = await self.exit_stack.enter_async_context(
+            streamablehttp_client(self.url))
+        self.session = await self.exit_stack.enter_async_context(ClientSession(self._receive, self._send))
         await self.session.initialize()
 
+    async def call_tool(self, name: str, arguments: dict, timeout: float | None = None) -> types.CallToolResult:
+        """Call a tool, giving up after `timeout` seconds; the server is told the same deadline so it
+        cancels the call too instead of finishing work nobody waits for."""
+        if timeout is None:
+            return await self.session.call_tool(name, arguments)
+        request = types.ClientRequest(types.CallToolRequest(
+            method="tools/call",
+            params=types.CallToolRequestParams(
+                name=name,
+                arguments=arguments,
+                _meta=types.RequestParams.Meta(**{TIMEOUT_META_KEY: int(timeout * 1000)}),
+            ),
+        ))
+        return await self.session.send_request(request, types.CallToolResult,
+                                               request_read_timeout_seconds=timedelta(seconds=timeout))
+
     async def cleanup(self):
         """Clean up resources"""
+        # Closing the HTTP client also aborts a request still in flight, which the server notices
         await self.exit_stack.aclose()
@@ -1,9 +1,16 @@
+from . import history_table
+from . import migrate
 from . import server_http
-import asyncio
 import argparse
 
 def main():
     parser = argparse.ArgumentParser(description='Invoice MCP Server')
+    parser.add_argument('command',
+                       nargs='?',
+                       choices=['serve', 'migrate', 'rebuild-history'],
+                       default='serve',
+                       help='Run the server (default), create the covering indexes in --db-path, or (re)build '
+                            'its denormalized PurchaseHistory table and the triggers keeping it in sync')
     parser.add_argument('--db-path', 
                        default="data/chinook.db",
                        help='Path to SQLite database file')
@@ -13,14 +20,114 @@ def main():
     parser.add_argument('--mcp-server-qna-path', 
                        default="",
                        help='your mcp server directory')
+    parser.add_argument('--mcp-server-qna-url',
+                       default=None,
+                       help='url of a shared QNA server started with --transport http (e.g. http://127.0.0.1:8001/mcp); '
+                            'overrides --mcp-server-qna-path')
+    parser.add_argument('--qna-pool-size',
+                       type=int,
+                       default=2,
+                       help='Number of warm QNA sessions kept open for media_lookup')
     parser.add_argument('--inf-url', 
                        default="https://integrate.api.nvidia.com/v1",
                        help='base url for inference')
 
+    parser.add_argument('--host',
+                       default="127.0.0.1",
+                       help='Host to bind')
+    parser.add_argument('--port',
+                       type=int,
+                       default=8000,
+                       help='Port to bind')
+    parser.add_argument('--uds',
+                       default=None,
+                       help='Bind to this unix domain socket instead of --host/--port')
+    parser.add_argument('--workers',
+                       type=int,
+                       default=1,
+                       help='Number of server processes; each opens its own database connections')
+    parser.add_argument('--sse',
+                       action='store_true',
+                       help='Answer tool calls with an SSE stream carrying progress notifications (media_lookup '
+                            'reports each QNA call and the answer text so far) instead of a single JSON response')
+    parser.add_argument('--debug',
+                       action='store_true',
+                       help='Return tracebacks in error responses')
+    parser.add_argument('--tool-timeout',
+                       type=float,
+                       default=None,
+                       help='Seconds after which invoice_lookup and media_lookup calls are cancelled; '
+                            'a shorter timeoutMs sent by the client in the request _meta wins')
+    parser.add_argument('--db-workers',
+                       type=int,
+                       default=8,
+                       help='Threads running database calls off the event loop')
+    parser.add_argument('--db-readers',
+                       type=int,
+                       default=4,
+                       help='Number of pooled read-only database connections')
+    parser.add_argument('--busy-timeout',
+                       type=int,
+                       default=5000,
+                       help='Milliseconds a connection waits for a database lock before failing')
+    parser.add_argument('--history-cache-rows',
+                       type=int,
+                       default=100_000,
+                       help='Invoice lines of per-customer purchase histories kept in memory (0 disables the cache)')
+    parser.add_argument('--refund-batch-window-ms',
+                       type=float,
+                       default=5.0,
+                       help='How long a refund waits for others to be committed in the same transaction')
+    parser.add_argument('--refund-batch-size',
+                       type=int,
+                       default=64,
+                       help='Maximum number of refunds committed in one transaction')
+    parser.add_argument('--no-media-fast-path',
+                       dest='media_fast_path',
+                       action='store_false',
+                       help='Send every media_lookup query to the agent, even "tracks by X" style ones')
+    parser.add_argument('--media-cache-path',
+                       default="data/media_cache.db",
+                       help='SQLite file caching media_lookup answers, shared by the workers (empty disables the cache)')
+    parser.add_argument('--media-cache-ttl',
+                       type=float,
+                       default=3600,
+                       help='Seconds a cached media_lookup answer stays valid')
+    parser.add_argument('--media-cache-max-mb',
+                       type=float,
+                       default=16,
+                       help='Size of cached media_lookup answers above which the least recently used are evicted')
+    parser.add_argument('--tool-concurrency',
+                       action='append',
+                       default=[],
+                       metavar='TOOL=N',
+                       help='Maximum concurrent calls of one tool, e.g. invoice_lookup=4 (repeatable)')
+
     args = parser.parse_args()
+    if args.command == 'migrate':
+        migrate.migrate(args.db_path)
+        return
+    if args.command == 'rebuild-history':
+        history_table.rebuild(args.db_path)
+        return
+
+    tool_concurrency = {}
+    for limit in args.tool_concurrency:
+        tool, _, n = limit.partition('=')
+        tool_concurrency[tool] = int(n)
 
     print("Starting Invoice MCP server...")
     # streamable http MCP server
-    asyncio.run(server_http.main(args.db_path,args.nvidia_api_key,args.mcp_server_qna_path,args.inf_url))
+    server_http.main(args.db_path, args.nvidia_api_key, args.mcp_server_qna_path, args.inf_url,
+                     host=args.host, port=args.port, uds=args.uds, workers=args.workers, sse=args.sse,
+                     debug=args.debug, tool_timeout=args.tool_timeout,
+                     db_workers=args.db_workers, tool_concurrency=tool_concurrency,
+                     mcp_server_qna_url=args.mcp_server_qna_url, db_readers=args.db_readers,
+                     busy_timeout_ms=args.busy_timeout, history_rows=args.history_cache_rows,
+                     refund_batch_window_ms=args.refund_batch_window_ms,
+                     refund_batch_size=args.refund_batch_size, qna_pool_size=args.qna_pool_size,
+                     media_cache_path=args.media_cache_path, media_cache_ttl=args.media_cache_ttl,
+                     media_cache_max_bytes=int(args.media_cache_max_mb * 1024 * 1024),
+                     media_fast_path=args.media_fast_path)
 
 __all__ = ['main']
@@ -0,0 +1,87 @@
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+from .db import InvoiceDB
+
+logger = logging.getLogger(__name__)
+
+NON_DIGITS_RE = re.compile(r"\D")
+
+
+def normalize_name(name: str | None) -> str:
+    return " ".join(unicodedata.normalize("NFKC", name or "").casefold().split())
+
+
+def normalize_phone(phone: str | None) -> str:
+    return NON_DIGITS_RE.sub("", phone or "")
+
+
+class CustomerIndex:
+    """In-memory hash index from a customer's (casefolded name, digits-only phone) to their CustomerId.
+
+    Names match regardless of case and spacing and phones regardless of formatting, so
+    '+1 (204) 452-6452' and '1 204 4526452' find the same customer; every digit must match though, so
+    '204 452-6452' (no country code) does not. The index is rebuilt when
+    the database changes (PRAGMA data_version), checked at most every `check_interval` seconds.
+    """
+
+    def __init__(self, db: InvoiceDB, check_interval: float = 1.0):
+        self.db = db
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # A connection of its own: data_version only moves for commits made by other connections
+        self._watch_conn = db.connect()
+        self._by_name: dict[tuple[str, str], dict[str, int]] = {}
+        self._data_version = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self._refresh()
+
+    def _refresh(self):
+        data_version = self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        with self.db.read() as conn:
+            rows = conn.execute("SELECT CustomerId, FirstName, LastName, Phone FROM Customer").fetchall()
+        by_name: dict[tuple[str, str], dict[str, int]] = {}
+        for customer_id, first_name, last_name, phone in rows:
+            if phone is None:
+                continue
+            by_name.setdefault((normalize_name(first_name), normalize_name(last_name)), {}).setdefault(
+                normalize_phone(phone), customer_id)
+        self._by_name = by_name
+        self._data_version = data_version
+        self.rebuilds += 1
+        logger.info("Indexed %d customers", len(rows))
+
+    def resolve(self, first_name: str, last_name: str, phone: str) -> int | None:
+        """The CustomerId for the given identity, or None if no customer matches."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at >= self.check_interval:
+                self._checked_at = now
+                self._refresh()
+            phones = self._by_name.get((normalize_name(first_name), normalize_name(last_name)), {})
+            customer_id = phones.get(normalize_phone(phone))
+            if customer_id is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return customer_id
+
+    def close(self):
+        self._watch_conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "customers": sum(len(phones) for phones in self._by_name.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "rebuilds": self.rebuilds,
+            }
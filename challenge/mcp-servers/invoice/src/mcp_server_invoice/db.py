@@ -0,0 +1,141 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class InvoiceDB:
+    """Connections to the Chinook DB: a bounded pool of readers and one dedicated writer.
+
+    With the database in WAL journaling (`mcp-server-invoice migrate` switches it, once and for good)
+    lookups keep reading while a refund is being written. Every connection waits up to `busy_timeout_ms`
+    for a lock instead of failing right away. The time each request spends waiting for a connection or
+    the write lock is recorded.
+    """
+
+    def __init__(self, db_path, readers: int = 4, busy_timeout_ms: int = 5000):
+        if readers < 1:
+            raise ValueError("reader pool size must be at least 1")
+        self.db_path = str(Path(db_path).resolve())
+        self.readers = readers
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle = queue.LifoQueue(maxsize=readers)
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._stats = {kind: {"requests": 0, "lock_wait_ms": 0.0, "max_lock_wait_ms": 0.0}
+                       for kind in ("read", "write")}
+
+        # Autocommit mode: write transactions are started explicitly with BEGIN IMMEDIATE
+        self._writer = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None,
+                                       timeout=busy_timeout_ms / 1000)
+        self._writer.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+        self.journal_mode = self._writer.execute("PRAGMA journal_mode").fetchone()[0]
+        if self.journal_mode == "wal":
+            # WAL only needs an fsync at checkpoints to stay durable against power loss
+            self._writer.execute("PRAGMA synchronous = NORMAL")
+        else:
+            logger.warning("%s is in %s journal mode, so lookups wait for refunds being written; "
+                           "run `mcp-server-invoice migrate` to switch it to WAL", self.db_path, self.journal_mode)
+        self._writer_lock = threading.Lock()
+        # Polled for data_version on its own connection, so the check never waits behind queued writes
+        self._watch_conn = self.connect()
+        self._watch_lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        """A new read-only connection outside the pool."""
+        conn = sqlite3.connect(f"{Path(self.db_path).as_uri()}?mode=ro", uri=True, check_same_thread=False,
+                               timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.readers
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self.connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        return self._idle.get()
+
+    def _record(self, kind: str, waited_ms: float):
+        with self._lock:
+            stats = self._stats[kind]
+            stats["requests"] += 1
+            stats["lock_wait_ms"] += waited_ms
+            stats["max_lock_wait_ms"] = max(stats["max_lock_wait_ms"], waited_ms)
+        logger.debug("%s request waited %.3f ms for the database", kind, waited_ms)
+
+    @contextmanager
+    def read(self):
+        """A pooled read-only connection."""
+        start = time.perf_counter()
+        conn = self._acquire()
+        self._record("read", (time.perf_counter() - start) * 1000)
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    @contextmanager
+    def write(self):
+        """The writer connection inside an immediate transaction, committed on success and rolled back on error."""
+        start = time.perf_counter()
+        with self._writer_lock:
+            # BEGIN IMMEDIATE takes the database write lock up front, waiting up to busy_timeout for it
+            self._writer.execute("BEGIN IMMEDIATE")
+            self._record("write", (time.perf_counter() - start) * 1000)
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            else:
+                self._writer.execute("COMMIT")
+
+    def data_version(self) -> int:
+        """PRAGMA data_version of the watch connection: it moves whenever any other connection commits,
+        our own writer included."""
+        with self._watch_lock:
+            return self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+        with self._watch_lock:
+            self._watch_conn.close()
+        with self._writer_lock:
+            self._writer.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "journal_mode": self.journal_mode,
+                "readers": self.readers,
+                "opened_readers": self._opened,
+                "idle_readers": self._idle.qsize(),
+                **{
+                    kind: {**stats, "avg_lock_wait_ms": stats["lock_wait_ms"] / max(1, stats["requests"])}
+                    for kind, stats in self._stats.items()
+                },
+            }
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from starlette.types import Receive, Scope, Send
+
+from .refunds import LATENCY_MS_BUCKETS, Histogram
+
+# Request `_meta` field carrying the milliseconds the client is still willing to wait for a tool call
+TIMEOUT_META_KEY = "timeoutMs"
+
+# Set while an MCP HTTP request is handled, once its client has gone away
+client_disconnected: ContextVar[asyncio.Event | None] = ContextVar("client_disconnected", default=None)
+
+
+def watch_disconnect(app):
+    """Wrap an ASGI app so that `client_disconnected` is set for the handlers of a request whose
+    client disconnects after sending its body (the MCP transport stops reading by then)."""
+
+    async def watched_app(scope: Scope, receive: Receive, send: Send):
+        disconnected = asyncio.Event()
+        body_read = asyncio.Event()
+
+        async def tracking_receive():
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body", False):
+                body_read.set()
+            return message
+
+        async def watch():
+            await body_read.wait()
+            while not disconnected.is_set():
+                if (await receive())["type"] == "http.disconnect":
+                    disconnected.set()
+
+        watcher = asyncio.create_task(watch())
+        token = client_disconnected.set(disconnected)
+        try:
+            await app(scope, tracking_receive, send)
+        finally:
+            client_disconnected.reset(token)
+            watcher.cancel()
+
+    return watched_app
+
+
+def request_timeout(meta, default: float | None) -> float | None:
+    """Seconds a tool call may run: what the client asked for in its request `_meta`, capped at `default`."""
+    timeout_ms = (meta.model_extra or {}).get(TIMEOUT_META_KEY) if meta is not None else None
+    try:
+        timeout = float(timeout_ms) / 1000 if timeout_ms is not None else None
+    except (TypeError, ValueError):
+        timeout = None
+    if timeout is None:
+        return default
+    return timeout if default is None else min(timeout, default)
+
+
+class CallGuard:
+    """Runs tool calls until they finish, their deadline passes or their HTTP client disconnects,
+    whichever comes first, and cancels the ones cut short so their work stops with them."""
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.cancelled = defaultdict(lambda: {"deadline_exceeded": 0, "client_disconnected": 0})
+        self.cancelled_after_ms = defaultdict(lambda: Histogram(LATENCY_MS_BUCKETS))
+
+    async def run(self, tool: str, call, timeout: float | None):
+        self.calls[tool] += 1
+        disconnected = client_disconnected.get()
+        start = time.perf_counter()
+        task = asyncio.create_task(call())
+        watcher = asyncio.create_task(disconnected.wait()) if disconnected is not None else None
+        try:
+            done, _ = await asyncio.wait([task, watcher] if watcher else [task], timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if task not in done:
+                task.cancel()
+                await asyncio.wait([task])
+                if task.cancelled():
+                    reason = "client_disconnected" if watcher in done else "deadline_exceeded"
+                    self.cancelled[tool][reason] += 1
+                    self.cancelled_after_ms[tool].observe((time.perf_counter() - start) * 1000)
+                    if reason == "client_disconnected":
+                        raise RuntimeError(f"{tool} cancelled: the client disconnected")
+                    raise TimeoutError(f"{tool} cancelled: no result within {timeout:.3f}s")
+            return task.result()
+        finally:
+            # Also reached when this handler itself is cancelled, e.g. on shutdown
+            task.cancel()
+            if watcher is not None:
+                watcher.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "tools": {
+                tool: {
+                    "calls": self.calls[tool],
+                    **self.cancelled[tool],
+                    "cancelled_after_ms": self.cancelled_after_ms[tool].stats(),
+                }
+                for tool in sorted(self.calls)
+            },
+        }
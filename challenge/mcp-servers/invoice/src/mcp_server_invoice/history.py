@@ -0,0 +1,137 @@
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+
+YEAR_MONTH_RE = re.compile(r"(\d{4})(?:-(\d{2}))?")
+
+
+def sql_date(value: str | None) -> str | None:
+    """The YYYY-MM-DD day of an ISO 8601 timestamp like SQLite's date(), or None if it cannot be parsed.
+
+    As in SQLite, a timestamp with a UTC offset is converted to UTC before its day is taken.
+    """
+    try:
+        moment = datetime.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date().isoformat()
+
+
+def day_range(date_from: str | None, date_to: str | None) -> tuple[str | None, str | None] | None:
+    """Half-open [first day, day after the last day) bounds for comparing against InvoiceDate text.
+
+    Bounds may be ISO 8601 dates or timestamps, YYYY-MM or YYYY; `date_to` includes the whole day,
+    month or year it names. A missing bound is None, and None is returned if a bound cannot be parsed.
+    """
+    try:
+        lower = _first_day(date_from, last=False) if date_from else None
+        upper = _first_day(date_to, last=True) if date_to else None
+    except ValueError:
+        return None
+    return lower, upper
+
+
+def _first_day(value: str, last: bool) -> str:
+    """The first day of the period `value` names or, if `last`, the first day after it."""
+    if (day := sql_date(value)) is not None:
+        first = date.fromisoformat(day)
+        return (first + timedelta(days=1) if last else first).isoformat()
+    match = YEAR_MONTH_RE.fullmatch(value.strip())
+    if match is None:
+        raise ValueError(f"not a date: {value!r}")
+    year, month = int(match[1]), int(match[2] or (12 if last else 1))
+    if not 1 <= month <= 12:
+        raise ValueError(f"not a month: {value!r}")
+    if last:
+        year, month = year + month // 12, month % 12 + 1
+    return date(year, month, 1).isoformat()
+
+
+class CustomerHistoryCache:
+    """LRU cache of each customer's full purchase history, keyed by CustomerId.
+
+    Memory is bounded by the total number of invoice lines held (`max_rows`), not by the number
+    of customers. Entries are dropped by `invalidate` when a refund deletes one of the customer's
+    lines, or all at once by `clear`; a history read that was in flight at that moment is not
+    stored (see `version`).
+    """
+
+    def __init__(self, max_rows: int = 100_000):
+        self.max_rows = max_rows
+        self._entries: OrderedDict[int, list[tuple]] = OrderedDict()
+        self._versions: dict[int, int] = {}
+        self._epoch = 0
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rows > 0
+
+    def version(self, customer_id: int) -> tuple[int, int]:
+        """Take before reading a history from the DB and pass to `put`."""
+        with self._lock:
+            return self._epoch, self._versions.get(customer_id, 0)
+
+    def get(self, customer_id: int) -> list[tuple] | None:
+        with self._lock:
+            rows = self._entries.get(customer_id)
+            if rows is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(customer_id)
+            self.hits += 1
+            return rows
+
+    def put(self, customer_id: int, rows: list[tuple], version: tuple[int, int]):
+        if len(rows) > self.max_rows:
+            return
+        with self._lock:
+            if (self._epoch, self._versions.get(customer_id, 0)) != version:
+                # Invalidated while it was being read
+                return
+            previous = self._entries.pop(customer_id, None)
+            self._rows -= len(previous or ())
+            self._entries[customer_id] = rows
+            self._rows += len(rows)
+            while self._rows > self.max_rows:
+                _, evicted = self._entries.popitem(last=False)
+                self._rows -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, customer_ids):
+        with self._lock:
+            for customer_id in customer_ids:
+                self._versions[customer_id] = self._versions.get(customer_id, 0) + 1
+                rows = self._entries.pop(customer_id, None)
+                if rows is not None:
+                    self._rows -= len(rows)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._rows = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "customers": len(self._entries),
+                "rows": self._rows,
+                "max_rows": self.max_rows,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,99 @@
+import sqlite3
+
+# Denormalized copy of the invoice lookup join, clustered by customer so that one customer's purchases
+# are a single range scan. Triggers keep it in sync with every write to the source tables, whichever
+# connection or process makes it; `rebuild` recreates it from scratch.
+TABLE = "PurchaseHistory"
+
+# The rows PurchaseHistory holds, restricted by a condition on the source tables
+SOURCE_ROWS = """
+    SELECT i.CustomerId, il.InvoiceLineId, il.InvoiceId, t.Name, art.Name, alb.Title, i.InvoiceDate,
+           il.Quantity, il.UnitPrice
+    FROM InvoiceLine il
+             JOIN Invoice i ON il.InvoiceId = i.InvoiceId
+             JOIN Track t ON il.TrackId = t.TrackId
+             JOIN Album alb ON t.AlbumId = alb.AlbumId
+             JOIN Artist art ON alb.ArtistId = art.ArtistId
+    WHERE {where}"""
+
+TABLE_SCHEMA = [
+    f"""CREATE TABLE IF NOT EXISTS {TABLE} (
+        CustomerId    INTEGER NOT NULL,
+        InvoiceLineId INTEGER NOT NULL,
+        InvoiceId     INTEGER NOT NULL,
+        TrackName     NVARCHAR(200),
+        ArtistName    NVARCHAR(120),
+        AlbumTitle    NVARCHAR(160),
+        InvoiceDate   DATETIME NOT NULL,
+        Quantity      INTEGER NOT NULL,
+        UnitPrice     NUMERIC(10,2) NOT NULL,
+        PRIMARY KEY (CustomerId, InvoiceLineId)
+    ) WITHOUT ROWID""",
+    # Lines and invoices are deleted by id, without knowing their customer
+    f"CREATE INDEX IF NOT EXISTS IX_{TABLE}_InvoiceLine ON {TABLE} (InvoiceLineId)",
+    f"CREATE INDEX IF NOT EXISTS IX_{TABLE}_Invoice ON {TABLE} (InvoiceId)",
+]
+
+
+def _refresh(delete_where: str, source_where: str) -> str:
+    return (f"DELETE FROM {TABLE} WHERE {delete_where}; "
+            f"INSERT INTO {TABLE} {SOURCE_ROWS.format(where=source_where)};")
+
+
+# (trigger name, event, body)
+TRIGGERS = [
+    ("InvoiceLine_Insert", "AFTER INSERT ON InvoiceLine",
+     _refresh("InvoiceLineId = NEW.InvoiceLineId", "il.InvoiceLineId = NEW.InvoiceLineId")),
+    ("InvoiceLine_Update", "AFTER UPDATE ON InvoiceLine",
+     _refresh("InvoiceLineId IN (OLD.InvoiceLineId, NEW.InvoiceLineId)", "il.InvoiceLineId = NEW.InvoiceLineId")),
+    ("InvoiceLine_Delete", "AFTER DELETE ON InvoiceLine",
+     f"DELETE FROM {TABLE} WHERE InvoiceLineId = OLD.InvoiceLineId;"),
+    # Lines may be inserted before their invoice
+    ("Invoice_Insert", "AFTER INSERT ON Invoice",
+     _refresh("InvoiceId = NEW.InvoiceId", "il.InvoiceId = NEW.InvoiceId")),
+    ("Invoice_Update", "AFTER UPDATE OF InvoiceId, CustomerId, InvoiceDate ON Invoice",
+     _refresh("InvoiceId IN (OLD.InvoiceId, NEW.InvoiceId)", "il.InvoiceId = NEW.InvoiceId")),
+    ("Invoice_Delete", "AFTER DELETE ON Invoice",
+     f"DELETE FROM {TABLE} WHERE InvoiceId = OLD.InvoiceId;"),
+    ("Track_Update", "AFTER UPDATE OF TrackId, Name, AlbumId ON Track",
+     _refresh("InvoiceLineId IN (SELECT InvoiceLineId FROM InvoiceLine WHERE TrackId IN (OLD.TrackId, NEW.TrackId))",
+              "il.TrackId IN (OLD.TrackId, NEW.TrackId)")),
+    ("Album_Update", "AFTER UPDATE OF AlbumId, Title, ArtistId ON Album",
+     _refresh("InvoiceLineId IN (SELECT il.InvoiceLineId FROM InvoiceLine il JOIN Track t ON il.TrackId = t.TrackId "
+              "WHERE t.AlbumId IN (OLD.AlbumId, NEW.AlbumId))",
+              "t.AlbumId IN (OLD.AlbumId, NEW.AlbumId)")),
+    ("Artist_Update", "AFTER UPDATE OF ArtistId, Name ON Artist",
+     _refresh("InvoiceLineId IN (SELECT il.InvoiceLineId FROM InvoiceLine il JOIN Track t ON il.TrackId = t.TrackId "
+              "JOIN Album alb ON t.AlbumId = alb.AlbumId WHERE alb.ArtistId IN (OLD.ArtistId, NEW.ArtistId))",
+              "alb.ArtistId IN (OLD.ArtistId, NEW.ArtistId)")),
+]
+
+
+def is_installed(conn: sqlite3.Connection) -> bool:
+    """Whether the table and all of its triggers exist, i.e. whether it can be trusted to be in sync."""
+    names = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+    return TABLE in names and all(f"{TABLE}_{name}" in names for name, _, _ in TRIGGERS)
+
+
+def rebuild(db_path: str):
+    """Create the table and its triggers if missing and refill it from the source tables, in one transaction."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in TABLE_SCHEMA:
+                conn.execute(statement)
+            for name, event, body in TRIGGERS:
+                conn.execute(f"DROP TRIGGER IF EXISTS {TABLE}_{name}")
+                conn.execute(f"CREATE TRIGGER {TABLE}_{name} {event} BEGIN {body} END")
+            conn.execute(f"DELETE FROM {TABLE}")
+            conn.execute(f"INSERT INTO {TABLE} {SOURCE_ROWS.format(where='1')}")
+            conn.execute(f"ANALYZE {TABLE}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        rows = conn.execute(f"SELECT count(*) FROM {TABLE}").fetchone()[0]
+        print(f"Rebuilt {TABLE} with {rows} invoice lines and {len(TRIGGERS)} triggers in {db_path}")
+    finally:
+        conn.close()
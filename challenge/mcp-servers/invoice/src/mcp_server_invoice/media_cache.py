@@ -0,0 +1,132 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+WORD_RE = re.compile(r"\w+(?:['’]\w+)*")
+
+
+def cache_key(query: str, routed: tuple[str, dict[str, str]] | None = None) -> str:
+    """Cache key of a media_lookup query.
+
+    A query the fast path routes to a single QNA lookup is keyed on that (tool, arguments), so
+    'Tracks by James Brown?' and 'list all songs by James Brown' share an entry. Any other query is
+    keyed on all of its words in order, ignoring only case, spacing and punctuation.
+    """
+    if routed is not None:
+        tool, arguments = routed
+        return json.dumps({"tool": tool, "arguments": arguments}, sort_keys=True)
+    return json.dumps({"query": " ".join(WORD_RE.findall(query.casefold()))})
+
+
+class MediaResponseCache:
+    """media_lookup responses keyed by `cache_key`, persisted in a local SQLite file.
+
+    Entries expire after `ttl` seconds; past `max_bytes` of responses the least recently used are
+    evicted. Everything is dropped when the catalog fingerprint passed to `check_catalog` changes.
+    The file can be shared by several server processes.
+    """
+
+    def __init__(self, path, ttl: float = 3600.0, max_bytes: int = 16 * 1024 * 1024, clock=time.time):
+        self.path = str(Path(path).resolve())
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        # A cache can lose its last writes on power loss without harm
+        self._conn.execute("PRAGMA synchronous = OFF")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key       TEXT PRIMARY KEY,
+                response  TEXT NOT NULL,
+                size      INTEGER NOT NULL,
+                expires   REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> str | None:
+        now = self.clock()
+        with self._lock:
+            row = self._conn.execute("SELECT response, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, expires = row
+            if expires <= now:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return response
+
+    def put(self, key: str, response: str):
+        size = len(response.encode())
+        if size > self.max_bytes:
+            return
+        now = self.clock()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                                   (key, response, size, now + self.ttl, now))
+                self._conn.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+                total = self._conn.execute("SELECT total(size) FROM entries").fetchone()[0]
+                while total > self.max_bytes:
+                    victim, victim_size = self._conn.execute(
+                        "SELECT key, size FROM entries ORDER BY last_used LIMIT 1").fetchone()
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (victim,))
+                    total -= victim_size
+                    self.evictions += 1
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def check_catalog(self, fingerprint: str):
+        """Drop every entry if the catalog fingerprint differs from the one the entries were cached under."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'catalog'").fetchone()
+            if row is not None and row[0] == fingerprint:
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("REPLACE INTO meta VALUES ('catalog', ?)", (fingerprint,))
+            self._conn.execute("COMMIT")
+            if row is not None:
+                self.invalidations += 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT count(*), total(size) FROM entries").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "bytes": int(size),
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,79 @@
+import itertools
+import sqlite3
+
+from . import history_table
+from .server_http import BULK_REFUND_TOTALS_QUERY, PURCHASE_HISTORY_QUERY, PURCHASE_HISTORY_TABLE_QUERY, Invoice
+
+# Covering indexes for the invoice tools; every statement is idempotent.
+INDEXES = [
+    # Invoices of a customer (resolved to a CustomerId in memory), seeked by purchase date range
+    # and with the purchase date available without touching the table
+    "CREATE INDEX IF NOT EXISTS IX_Invoice_Customer_Date ON Invoice (CustomerId, InvoiceDate)",
+    # Lines of an invoice with the columns the lookup and the refund totals read
+    "CREATE INDEX IF NOT EXISTS IX_InvoiceLine_Invoice_Cover ON InvoiceLine (InvoiceId, TrackId, UnitPrice, Quantity)",
+]
+
+OPTIONAL_FILTERS = ["track_name", "album_title", "artist_name", "purchase_date_iso_8601", "purchase_date_from",
+                    "purchase_date_to"]
+
+
+def query_shapes(denormalized: bool = False) -> list[tuple[str, str, list]]:
+    """(name, query, params) for every statement shape the invoice tools emit, including the lookups on
+    the PurchaseHistory table if `denormalized`."""
+    shapes = [("invoice_lookup [purchase history]", PURCHASE_HISTORY_QUERY, [1])]
+    if denormalized:
+        shapes.append(("invoice_lookup [purchase history, denormalized]", PURCHASE_HISTORY_TABLE_QUERY, [1]))
+    for table in [False, True] if denormalized else [False]:
+        for n in range(len(OPTIONAL_FILTERS) + 1):
+            for present in itertools.combinations(OPTIONAL_FILTERS, n):
+                filters = {key: ("2021-01-01" if key.startswith("purchase_date") else "x") if key in present else None
+                           for key in OPTIONAL_FILTERS}
+                query, params = Invoice._invoice_lookup_query(1, **filters, denormalized=table)
+                name = ", ".join(present) or "customer only"
+                shapes.append((f"invoice_lookup [{name}{', denormalized' if table else ''}]", query, params))
+
+    shapes += [
+        ("invoice_refund [invoice total]", "SELECT Total FROM Invoice WHERE InvoiceId = ?", [1]),
+        ("invoice_refund [delete invoice lines]", "DELETE FROM InvoiceLine WHERE InvoiceId = ?", [1]),
+        ("invoice_refund [delete invoice]", "DELETE FROM Invoice WHERE InvoiceId = ?", [1]),
+        ("invoice_refund [line total]",
+         "SELECT SUM(UnitPrice * Quantity) FROM InvoiceLine WHERE InvoiceLineId IN (?, ?)", [1, 2]),
+        ("invoice_refund [delete lines]", "DELETE FROM InvoiceLine WHERE InvoiceLineId IN (?, ?)", [1, 2]),
+        ("invoice_refund_bulk [totals]", BULK_REFUND_TOTALS_QUERY, ["[1, 2]", "[[1, 2], [3]]"]),
+        ("invoice_refund_bulk [delete line]", "DELETE FROM InvoiceLine WHERE InvoiceLineId = ?", [1]),
+    ]
+    return shapes
+
+
+def explain(conn: sqlite3.Connection, query: str, params: list) -> list[str]:
+    """The EXPLAIN QUERY PLAN detail lines of a statement."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+def migrate(db_path: str):
+    """Switch the database to WAL journaling, create the covering indexes, refresh the planner statistics
+    and print every plan before and after."""
+    conn = sqlite3.connect(db_path)
+    try:
+        shapes = query_shapes(history_table.is_installed(conn))
+        before = [explain(conn, query, params) for _, query, params in shapes]
+
+        # Persistent: the database stays in WAL, with -wal and -shm files next to it while it is open
+        journal_mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        with conn:
+            for statement in INDEXES:
+                conn.execute(statement)
+            conn.execute("ANALYZE")
+
+        for (name, query, params), old_plan in zip(shapes, before):
+            new_plan = explain(conn, query, params)
+            print(f"== {name}")
+            print("  before:")
+            for line in old_plan:
+                print(f"    {line}")
+            print("  after:")
+            for line in new_plan:
+                print(f"    {line}")
+        print(f"Created or verified {len(INDEXES)} indexes and analyzed {db_path} (journal mode: {journal_mode})")
+    finally:
+        conn.close()
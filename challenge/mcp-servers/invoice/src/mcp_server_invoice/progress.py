@@ -0,0 +1,75 @@
+import logging
+import time
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import (FunctionToolCallEvent, FunctionToolResultEvent, PartDeltaEvent, PartStartEvent,
+                                  TextPart, TextPartDelta)
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressReporter:
+    """MCP progress notifications for one media_lookup call.
+
+    `send(progress, message)` is called with an increasing progress count: once per QNA tool call and
+    result, and with the text of the model response so far while it streams, at most every
+    `min_interval` seconds. Failing to send never fails the lookup.
+    """
+
+    def __init__(self, send, min_interval: float = 0.1):
+        self.send = send
+        self.min_interval = min_interval
+        self.progress = 0
+        self.text = ""
+        self._unsent = False
+        self._sent_at = 0.0
+
+    async def step(self, message: str):
+        await self.flush()
+        await self._send(message)
+
+    def new_response(self):
+        self.text = ""
+        self._unsent = False
+
+    async def add_text(self, delta: str):
+        self.text += delta
+        self._unsent = True
+        if time.monotonic() - self._sent_at >= self.min_interval:
+            await self.flush()
+
+    async def flush(self):
+        if self._unsent:
+            self._unsent = False
+            await self._send(self.text)
+
+    async def _send(self, message: str):
+        self.progress += 1
+        self._sent_at = time.monotonic()
+        try:
+            await self.send(self.progress, message)
+        except Exception:
+            logger.debug("Could not send progress notification", exc_info=True)
+
+
+async def run_with_progress(agent: Agent, query: str, reporter: ProgressReporter):
+    """`agent.run(query)`, streaming model responses and tool calls to `reporter` as they happen."""
+    async with agent.iter(query) as run:
+        async for node in run:
+            if Agent.is_model_request_node(node):
+                reporter.new_response()
+                async with node.stream(run.ctx) as stream:
+                    async for event in stream:
+                        if isinstance(event, PartStartEvent) and isinstance(event.part, TextPart):
+                            await reporter.add_text(event.part.content)
+                        elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
+                            await reporter.add_text(event.delta.content_delta)
+                await reporter.flush()
+            elif Agent.is_call_tools_node(node):
+                async with node.stream(run.ctx) as events:
+                    async for event in events:
+                        if isinstance(event, FunctionToolCallEvent):
+                            await reporter.step(f"Calling {event.part.tool_name}({event.part.args_as_json_str()})")
+                        elif isinstance(event, FunctionToolResultEvent):
+                            await reporter.step(f"{event.result.tool_name} returned")
+    return run.result
@@ -1,14 +1,43 @@
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+import mcp.types as types
+from mcp.client.streamable_http import streamablehttp_client
 from pydantic import BaseModel
 from pydantic_ai import Agent
-from pydantic_ai.mcp import MCPServerStdio
+from pydantic_ai.mcp import MCPServerHTTP, MCPServerStdio
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.openai import OpenAIProvider
 
+from .progress import ProgressReporter
+from .qna_pool import QNASessionPool
+
 
 class AgentOutput(BaseModel):
     output: str
 
 
+class QNAServerHTTP(MCPServerHTTP):
+    """MCPServerHTTP with its streams opened by `streamablehttp_client` directly.
+
+    pydantic-ai 0.2.x passes `sse_read_timeout=timedelta(300)` (300 days), which mcp reads back
+    through `.seconds` as 0, so every request timed out.
+    """
+
+    @asynccontextmanager
+    async def client_streams(self):
+        async with streamablehttp_client(
+            url=self.url,
+            headers=self.headers,
+            timeout=timedelta(seconds=self.timeout),
+            sse_read_timeout=timedelta(seconds=self.sse_read_timeout),
+        ) as (read_stream, write_stream, _):
+            yield read_stream, write_stream
+
+
+# Resource of the QNA server holding the version of the catalog it answers from
+CATALOG_URI = "qna://catalog"
+
 system_prompt = """
 You are an online music store agent tasked to retrieve a list of song tracks.
 Only base your reply on the context provided.
@@ -16,17 +45,46 @@ Only base your reply on the context provided.
 
 
 class QNAAgent:
-    def __init__(self, nvidia_api_key, mcp_server_qna_path, inf_url):
+    def __init__(self, nvidia_api_key, mcp_server_qna_path, inf_url, mcp_server_qna_url=None, pool_size=2):
         ## TODO
         ## define MCP server, model and agent
         print(f"Starting QNA Agent... {nvidia_api_key}")
         provider = OpenAIProvider(base_url=inf_url, api_key=nvidia_api_key)
         model = OpenAIModel(model_name="gpt-4o", provider=provider)
-        mcp_server = MCPServerStdio("qna_server", mcp_server_qna_path)
-        self.agent = Agent(model, mcp_servers=[mcp_server])
 
-    async def run(self, query):
+        def make_server():
+            if mcp_server_qna_url:
+                # a shared QNA server started with `--transport http`, instead of a stdio subprocess per agent
+                return QNAServerHTTP(url=mcp_server_qna_url)
+            return MCPServerStdio("qna_server", mcp_server_qna_path)
+
+        # warm, initialized QNA sessions reused across runs instead of starting the server for every query
+        self.pool = QNASessionPool(make_server, lambda server: Agent(model, mcp_servers=[server]), size=pool_size)
+
+    async def start(self):
+        await self.pool.start()
+
+    async def stop(self):
+        await self.pool.stop()
+
+    def stats(self) -> dict:
+        return self.pool.stats()
+
+    async def run(self, query, progress: ProgressReporter | None = None):
         ## TODO
         ## run agent with mcp servers and return output
-        response = await self.agent.run(query)
+        response = await self.pool.run(query, progress)
         return response.output
+
+    async def call_tool(self, name, arguments) -> str:
+        """Call a QNA lookup tool directly and return its text output."""
+        result = await self.pool.call_tool(name, arguments)
+        text = "\n".join(part.text for part in result.content if isinstance(part, types.TextContent))
+        if result.isError or text.startswith("Error:"):
+            raise RuntimeError(f"{name} failed: {text}")
+        return text
+
+    async def catalog_version(self) -> str:
+        """Version of the QNA catalog: changes whenever its answers may have."""
+        result = await self.pool.read_resource(CATALOG_URI)
+        return "".join(part.text for part in result.contents if isinstance(part, types.TextResourceContents))
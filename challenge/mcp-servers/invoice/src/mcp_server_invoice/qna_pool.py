@@ -0,0 +1,233 @@
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Callable
+
+import anyio
+import mcp.types as types
+from mcp import ClientSession
+from pydantic import AnyUrl
+from pydantic_ai import Agent
+from pydantic_ai.mcp import MCPServer
+
+from .progress import ProgressReporter, run_with_progress
+
+logger = logging.getLogger(__name__)
+
+
+def client_session(server: MCPServer) -> ClientSession:
+    """The MCP client session of a running pydantic-ai MCP server, for the requests the agent never makes.
+
+    pydantic-ai has no public accessor for it: this reads the private `_client` attribute, which is
+    why pyproject.toml keeps pydantic-ai below 0.3. Every such access goes through here.
+    """
+    return server._client
+
+
+@contextlib.asynccontextmanager
+async def running(server: MCPServer):
+    """`async with server`, except that a failed start also closes what the server had opened so far.
+
+    pydantic-ai 0.2.x leaves it open, and a transport task group left open keeps cancelling the task that
+    started it over and over.
+    """
+    try:
+        await server.__aenter__()
+    except BaseException:
+        with contextlib.suppress(Exception):
+            await server.__aexit__(None, None, None)
+        raise
+    try:
+        yield server
+    finally:
+        await server.__aexit__(None, None, None)
+
+
+class QNAWorker:
+    """One warm QNA MCP session and the agent bound to it, owned by a supervising task."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.agent: Agent | None = None
+        self.server: MCPServer | None = None
+        self.ready = asyncio.Event()
+        self.attempted = asyncio.Event()
+        self.check = asyncio.Event()
+        self.in_flight = 0
+        self.runs = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.restarts = 0
+        self.busy_seconds = 0.0
+        self._busy_since = 0.0
+
+    def begin(self):
+        if self.in_flight == 0:
+            self._busy_since = time.monotonic()
+        self.in_flight += 1
+
+    def end(self, outcome: str):
+        self.in_flight -= 1
+        self.runs += 1
+        self.failures += outcome == "failed"
+        self.cancelled += outcome == "cancelled"
+        if self.in_flight == 0:
+            self.busy_seconds += time.monotonic() - self._busy_since
+
+    def stats(self) -> dict:
+        busy = self.busy_seconds + (time.monotonic() - self._busy_since if self.in_flight else 0.0)
+        return {
+            "ready": self.ready.is_set(),
+            "in_flight": self.in_flight,
+            "runs": self.runs,
+            "failures": self.failures,
+            "cancelled": self.cancelled,
+            "restarts": self.restarts,
+            "busy_seconds": busy,
+        }
+
+
+class QNASessionPool:
+    """A fixed number of pre-started, initialized QNA MCP sessions shared by the media_lookup agent runs.
+
+    Each session runs in its own supervising task (the MCP client has to be entered and exited in
+    the same task). Runs go to the ready worker with the fewest runs in flight. A worker whose run
+    fails is pinged right away, and every worker is pinged each `ping_interval` seconds; one that
+    does not answer (e.g. its QNA subprocess crashed) is closed and started again, backing off
+    from `restart_delay` up to `max_restart_delay` while it keeps failing.
+    """
+
+    def __init__(self, make_server: Callable[[], MCPServer], make_agent: Callable[[MCPServer], Agent],
+                 size: int = 2, ping_interval: float = 30.0, ping_timeout: float = 5.0, restart_delay: float = 1.0,
+                 max_restart_delay: float = 30.0, acquire_timeout: float = 30.0, start_timeout: float = 30.0):
+        self.make_server = make_server
+        self.make_agent = make_agent
+        self.size = max(1, size)
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.acquire_timeout = acquire_timeout
+        self.start_timeout = start_timeout
+        self.workers = [QNAWorker(i) for i in range(self.size)]
+        self._tasks: list[asyncio.Task] = []
+        self._available: asyncio.Condition | None = None
+        self._started_at = 0.0
+
+    async def start(self):
+        """Start every session and wait until each one is initialized or has failed to start once, for at
+        most `start_timeout` seconds: with the QNA server down the pool starts degraded and keeps retrying."""
+        self._available = asyncio.Condition()
+        self._started_at = time.monotonic()
+        self._tasks = [asyncio.create_task(self._supervise(worker)) for worker in self.workers]
+        waits = [asyncio.create_task(worker.attempted.wait()) for worker in self.workers]
+        _, pending = await asyncio.wait(waits, timeout=self.start_timeout)
+        for wait in pending:
+            wait.cancel()
+        ready = sum(worker.ready.is_set() for worker in self.workers)
+        if ready < self.size:
+            logger.warning("QNA session pool started with %d of %d sessions ready", ready, self.size)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+
+    async def _supervise(self, worker: QNAWorker):
+        delay = self.restart_delay
+        while True:
+            try:
+                server = self.make_server()
+                async with running(server):
+                    worker.server, worker.agent = server, self.make_agent(server)
+                    worker.ready.set()
+                    worker.attempted.set()
+                    delay = self.restart_delay
+                    await self._notify()
+                    logger.info("QNA session %d ready", worker.index)
+                    while True:
+                        with contextlib.suppress(asyncio.TimeoutError):
+                            await asyncio.wait_for(worker.check.wait(), self.ping_interval)
+                        worker.check.clear()
+                        with anyio.fail_after(self.ping_timeout):
+                            await client_session(server).send_ping()
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+                # Not meant for this task: e.g. a cancel scope of the MCP client torn down by a failed connection
+                logger.exception("QNA session %d was cancelled from within, restarting", worker.index)
+            except Exception:
+                logger.exception("QNA session %d failed, restarting", worker.index)
+            finally:
+                worker.ready.clear()
+                worker.server = worker.agent = None
+                worker.attempted.set()
+            worker.restarts += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_restart_delay)
+
+    async def _notify(self):
+        async with self._available:
+            self._available.notify_all()
+
+    async def _acquire(self) -> QNAWorker:
+        if self._available is None:
+            raise RuntimeError("QNA session pool is not started")
+        async with self._available:
+            while True:
+                ready = [worker for worker in self.workers if worker.ready.is_set()]
+                if ready:
+                    worker = min(ready, key=lambda w: w.in_flight)
+                    worker.begin()
+                    return worker
+                try:
+                    await asyncio.wait_for(self._available.wait(), self.acquire_timeout)
+                except asyncio.TimeoutError:
+                    raise RuntimeError("No QNA session available") from None
+
+    async def _on_worker(self, call):
+        worker = await self._acquire()
+        outcome = "failed"
+        try:
+            result = await call(worker)
+            outcome = "ok"
+            return result
+        except asyncio.CancelledError:
+            # Deadline passed or the client went away: the agent run and its pending calls stop here
+            outcome = "cancelled"
+            raise
+        finally:
+            worker.end(outcome)
+            if outcome == "failed":
+                # The call may have failed because the session died: have its supervisor check now
+                worker.check.set()
+
+    async def run(self, query: str, progress: ProgressReporter | None = None):
+        """Run the agent on the least loaded warm session, reporting its steps to `progress` if given."""
+        if progress is None:
+            return await self._on_worker(lambda worker: worker.agent.run(query))
+        return await self._on_worker(lambda worker: run_with_progress(worker.agent, query, progress))
+
+    async def call_tool(self, name: str, arguments: dict) -> types.CallToolResult:
+        """Call a QNA tool directly on the least loaded warm session, without the agent."""
+        return await self._on_worker(lambda worker: client_session(worker.server).call_tool(name, arguments))
+
+    async def read_resource(self, uri: str) -> types.ReadResourceResult:
+        """Read a QNA resource on the least loaded warm session."""
+        return await self._on_worker(lambda worker: client_session(worker.server).read_resource(AnyUrl(uri)))
+
+    def stats(self) -> dict:
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        workers = [worker.stats() for worker in self.workers]
+        busy = sum(worker["busy_seconds"] for worker in workers)
+        return {
+            "size": self.size,
+            "ready": sum(worker["ready"] for worker in workers),
+            "in_flight": sum(worker["in_flight"] for worker in workers),
+            "utilization": busy / (uptime * self.size) if uptime else 0.0,
+            "workers": workers,
+        }
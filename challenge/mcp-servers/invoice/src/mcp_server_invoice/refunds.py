@@ -0,0 +1,137 @@
+import asyncio
+import bisect
+import logging
+import time
+
+from .executor import DBExecutor
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+LATENCY_MS_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+class Histogram:
+    """Counts of observed values per bucket, the last bucket catching everything above the largest bound."""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "buckets": {f"le_{bound}": n for bound, n in zip(self.bounds, self.counts)} | {"inf": self.counts[-1]},
+        }
+
+
+class RefundQueue:
+    """Group commit for refunds: concurrent refunds are queued and written in one transaction per batch.
+
+    A single writer task takes the first pending refund, waits up to `window_ms` for more (or until
+    `max_batch` are pending), applies the whole batch with `apply_batch` on the DB executor and resolves
+    each caller with its own total. A refund is applied even if its caller stops waiting for it.
+    """
+
+    def __init__(self, executor: DBExecutor, apply_batch, window_ms: float = 5.0, max_batch: int = 64,
+                 tool: str = "invoice_refund"):
+        self.executor = executor
+        self.apply_batch = apply_batch
+        self.window_ms = window_ms
+        self.max_batch = max(1, max_batch)
+        self.tool = tool
+        self._pending: asyncio.Queue | None = None
+        self._full: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.commit_ms = Histogram(LATENCY_MS_BUCKETS)
+        self.refund_ms = Histogram(LATENCY_MS_BUCKETS)
+        self.failed_batches = 0
+
+    def start(self):
+        """Start the writer task on the running event loop."""
+        self._pending = asyncio.Queue()
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        while not self._pending.empty():
+            _, future, _ = self._pending.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Refund queue stopped"))
+        self._task = None
+
+    async def submit(self, invoice_id: int | None, invoice_line_ids: list[int] | None) -> float:
+        """Queue one refund and wait for the commit of its batch; returns the refunded total."""
+        if self._task is None:
+            raise RuntimeError("Refund queue is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.put_nowait(((invoice_id, invoice_line_ids), future, time.perf_counter()))
+        if self._pending.qsize() >= self.max_batch:
+            self._full.set()
+        return await future
+
+    async def _writer(self):
+        while True:
+            batch = [await self._pending.get()]
+            self._full.clear()
+            if self._pending.qsize() + 1 < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.window_ms / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self.max_batch and not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+            await self._commit(batch)
+
+    async def _commit(self, batch: list):
+        start = time.perf_counter()
+        try:
+            results = await self.executor.run(self.tool, self.apply_batch, [refund for refund, _, _ in batch])
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Refund queue stopped"))
+            raise
+        except Exception as e:
+            logger.exception("Refund batch of %d failed", len(batch))
+            self.failed_batches += 1
+            results = [e] * len(batch)
+
+        done = time.perf_counter()
+        self.batch_size.observe(len(batch))
+        self.commit_ms.observe((done - start) * 1000)
+        for (_, future, queued_at), result in zip(batch, results):
+            self.refund_ms.observe((done - queued_at) * 1000)
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window_ms,
+            "max_batch": self.max_batch,
+            "pending": self._pending.qsize() if self._pending else 0,
+            "failed_batches": self.failed_batches,
+            "batch_size": self.batch_size.stats(),
+            "commit_ms": self.commit_ms.stats(),
+            "refund_ms": self.refund_ms.stats(),
+        }
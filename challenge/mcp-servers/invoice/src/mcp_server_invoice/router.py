@@ -0,0 +1,80 @@
+import re
+import threading
+
+_POLITE = r"(?:(?:please|can you|could you|would you)\s+)?(?:(?:list|show|find|get|give)(?:\s+me)?\s+)?" \
+          r"(?:(?:all|every)\s+)?(?:(?:of\s+)?the\s+)?"
+_NAME = r"[\"“]?(?P<name>.+?)[\"”]?"
+_END = r"\s*[?.!]*"
+
+# (pattern, QNA tool, filter the captured name goes to); the first full match wins
+PATTERNS = [
+    (rf"{_POLITE}(?:tracks|songs)\s+(?:on|from|in)\s+the\s+album\s+{_NAME}{_END}", "lookup_track", "album_title"),
+    (rf"{_POLITE}(?:tracks|songs)\s+by\s+(?:the\s+artist\s+)?{_NAME}{_END}", "lookup_track", "artist_name"),
+    (rf"{_POLITE}(?:albums|records)\s+by\s+(?:the\s+artist\s+)?{_NAME}{_END}", "lookup_album", "artist_name"),
+    (rf"{_POLITE}(?:albums|records)\s+(?:with|containing|featuring)\s+the\s+(?:track|song)\s+{_NAME}{_END}",
+     "lookup_album", "track_name"),
+    (rf"who\s+(?:made|recorded|released)\s+the\s+album\s+{_NAME}{_END}", "lookup_artist", "album_title"),
+    (rf"who\s+(?:sings|sang|performs|performed|recorded|plays|played)\s+(?:the\s+(?:track|song)\s+)?{_NAME}{_END}",
+     "lookup_artist", "track_name"),
+]
+PATTERNS = [(re.compile(pattern, re.IGNORECASE), tool, key) for pattern, tool, key in PATTERNS]
+
+# A captured name containing one of these probably carries a second constraint the patterns do not model
+AMBIGUOUS_NAME = re.compile(
+    r"\b(?:and|or|not|but|on|from|in|with|without|by|before|after|since|between|released|that|which|who|"
+    r"album|albums|track|tracks|song|songs|artist|artists|genre|playlist|price|cost|cheap|expensive|"
+    r"similar|like|popular|best|top|most|least|first|last|latest|newest|oldest)\b"
+    r"|[?!,;:]|\d{4}",
+    re.IGNORECASE)
+MAX_NAME_LENGTH = 120
+
+
+class FastPathRouter:
+    """Maps trivially structured media_lookup queries ("tracks by X", "albums by X", "who sings Y")
+    to a single QNA lookup, so they can skip the agent.
+
+    Anything the patterns do not match exactly, or whose captured name looks like it holds more than
+    one constraint, is left to the agent. Counts how queries were routed.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.hits = 0
+        self.fallbacks = {"no_match": 0, "empty": 0, "error": 0}
+
+    def match(self, query: str) -> tuple[str, dict[str, str]] | None:
+        """The (tool, arguments) answering the query on its own, or None to ask the agent."""
+        with self._lock:
+            self.queries += 1
+        if self.enabled:
+            query = " ".join(query.split())
+            for pattern, tool, key in PATTERNS:
+                found = pattern.fullmatch(query)
+                if found is None:
+                    continue
+                name = found["name"].strip()
+                if name and len(name) <= MAX_NAME_LENGTH and not AMBIGUOUS_NAME.search(name):
+                    return tool, {key: name}
+                break
+        self.fallback("no_match")
+        return None
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def fallback(self, reason: str):
+        with self._lock:
+            self.fallbacks[reason] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "queries": self.queries,
+                "hits": self.hits,
+                "hit_ratio": self.hits / self.queries if self.queries else 0.0,
+                "fallbacks": dict(self.fallbacks),
+            }
@@ -1,7 +1,12 @@
+import asyncio
 import contextlib
+import importlib.util
 import json
 import logging
+import os
 import sqlite3
+import threading
+import time
 from collections.abc import AsyncIterator
 from pathlib import Path
 from typing import Any
@@ -12,19 +17,119 @@ import uvicorn
 from mcp.server.lowlevel import Server
 from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
 from starlette.applications import Starlette
-from starlette.routing import Mount
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
 from starlette.types import Receive, Scope, Send
 
-from . import qna_agent
+from . import history_table, qna_agent
+from .customers import CustomerIndex
+from .db import InvoiceDB
+from .deadline import CallGuard, request_timeout, watch_disconnect
+from .executor import DBExecutor
+from .history import CustomerHistoryCache, day_range
+from .media_cache import MediaResponseCache, cache_key
+from .progress import ProgressReporter
+from .refunds import RefundQueue
+from .router import FastPathRouter
+from .singleflight import SingleFlight, flight_key
 
 # import qna_agent
 
 logger = logging.getLogger(__name__)
 
+# Environment variable carrying the create_app arguments to uvicorn worker processes
+APP_CONFIG_ENV = "MCP_SERVER_INVOICE_CONFIG"
+
+# Refunds write to the DB, running them one at a time keeps them from contending for the write lock
+DEFAULT_TOOL_CONCURRENCY = {"invoice_refund": 1, "invoice_refund_bulk": 1}
+
+# Read-only tools: identical concurrent calls share one execution, and a call is cancelled once its
+# deadline passes or its client disconnects. Refunds always run to completion.
+READ_ONLY_TOOLS = {"invoice_lookup", "media_lookup"}
+
+# The media_lookup fast path pages through a QNA lookup this many rows at a time (the QNA maximum), up to
+# FAST_PATH_MAX_ROWS; past that it answers with those rows and the number of matches
+FAST_PATH_PAGE_SIZE = 200
+FAST_PATH_MAX_ROWS = 1000
+
+# Refund totals of a whole bulk refund in one statement. :invoice_ids is a JSON array of invoice ids,
+# :line_groups a JSON array of line-id groups; lines of invoices refunded in full are left out of the group totals.
+BULK_REFUND_TOTALS_QUERY = """
+                SELECT 'invoice' as kind, inv.key as item, coalesce(i.Total, 0.0)
+                FROM json_each(:invoice_ids) inv
+                         LEFT JOIN Invoice i ON i.InvoiceId = inv.value
+                UNION ALL
+                SELECT 'lines', grp.key, coalesce(sum(il.UnitPrice * il.Quantity), 0.0)
+                FROM json_each(:line_groups) grp
+                         JOIN json_each(grp.value) line
+                         LEFT JOIN InvoiceLine il ON il.InvoiceLineId = line.value
+                    AND il.InvoiceId NOT IN (SELECT value FROM json_each(:invoice_ids))
+                GROUP BY grp.key \
+                """
+
+# Every invoice line of one customer: the lookup columns followed by the album title the optional filter
+# is applied to
+PURCHASE_HISTORY_QUERY = """
+                SELECT il.InvoiceLineId,
+                       t.Name              as track_name,
+                       art.Name            as artist_name,
+                       i.InvoiceDate       as purchase_date,
+                       il.Quantity         as quantity_purchased,
+                       il.UnitPrice        as price_per_unit,
+                       alb.Title           as album_title
+                FROM Invoice i
+                         JOIN InvoiceLine il ON il.InvoiceId = i.InvoiceId
+                         JOIN Track t ON il.TrackId = t.TrackId
+                         JOIN Album alb ON t.AlbumId = alb.AlbumId
+                         JOIN Artist art ON alb.ArtistId = art.ArtistId
+                WHERE i.CustomerId = ?
+                ORDER BY il.InvoiceLineId \
+                """
+
+# PURCHASE_HISTORY_QUERY read from the denormalized PurchaseHistory table, when it is installed
+PURCHASE_HISTORY_TABLE_QUERY = f"""
+                SELECT InvoiceLineId, TrackName, ArtistName, InvoiceDate, Quantity, UnitPrice, AlbumTitle
+                FROM {history_table.TABLE}
+                WHERE CustomerId = ?
+                ORDER BY InvoiceLineId \
+                """
+
 
 class Invoice:
-    def __init__(self, db_path):
+    def __init__(self, db_path, readers: int = 4, busy_timeout_ms: int = 5000, history_rows: int = 100_000):
         self.db_path = str(Path().resolve().joinpath(db_path))
+        self.db = InvoiceDB(self.db_path, readers=readers, busy_timeout_ms=busy_timeout_ms)
+        self.customers = CustomerIndex(self.db)
+        self.history = CustomerHistoryCache(max_rows=history_rows)
+        with self.db.read() as conn:
+            # Created by `mcp-server-invoice rebuild-history`; without it lookups join the source tables
+            self.denormalized = history_table.is_installed(conn)
+        self.external_check_interval = 1.0
+        self._external_lock = threading.Lock()
+        self._external_version = self.db.data_version()
+        self._external_checked_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {**self.db.stats(), "customers": self.customers.stats(), "history": self.history.stats(),
+                "denormalized": self.denormalized}
+
+    def close(self):
+        self.customers.close()
+        self.db.close()
+
+    def _check_external_writes(self):
+        """Drop every cached history once another connection (another worker, or a tool outside
+        the server) has committed to the DB, since its refunds never reach our invalidation."""
+        now = time.monotonic()
+        if now - self._external_checked_at < self.external_check_interval:
+            return
+        with self._external_lock:
+            self._external_checked_at = now
+            version = self.db.data_version()
+            if version != self._external_version:
+                self._external_version = version
+                self.history.clear()
 
     def _invoice_refund(self, invoice_id: int | None, invoice_line_ids: list[int] | None, mock: bool = True) -> List[
         types.TextContent]:
@@ -39,153 +144,334 @@ class Invoice:
         if invoice_id is None and invoice_line_ids is None:
             return 0.0
 
-        # Connect to the Chinook database
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Customers whose lines are deleted, their cached purchase histories are dropped after the commit
+        refunded_customers = set()
 
+        # A mock refund only reads, so it never has to wait for the writer
+        with self.db.read() if mock else self.db.write() as conn:
+            total_refund = self._apply_refund(conn, invoice_id, invoice_line_ids, mock, refunded_customers)
+
+        self.history.invalidate(refunded_customers)
+
+        return [types.TextContent(
+            type="text",
+            text=str(total_refund)
+        )]
+
+    def _apply_refund(self, conn: sqlite3.Connection, invoice_id: int | None, invoice_line_ids: list[int] | None,
+                      mock: bool, refunded_customers: set[int]) -> float:
+        """Total (and unless `mock`, delete) one refund inside the caller's transaction.
+
+        The CustomerIds of deleted lines are added to `refunded_customers`.
+        """
         total_refund = 0.0
+        cursor = conn.cursor()
 
-        try:
-            # If invoice_id is provided, delete entire invoice and its lines
-            if invoice_id is not None:
-                # First get the total amount for the invoice
+        # If invoice_id is provided, delete entire invoice and its lines
+        if invoice_id is not None:
+            # First get the total amount for the invoice
+            cursor.execute(
+                """
+                SELECT Total
+                FROM Invoice
+                WHERE InvoiceId = ?
+                """,
+                (invoice_id,),
+            )
+
+            result = cursor.fetchone()
+            if result:
+                total_refund += result[0]
+
+            # Delete invoice lines first (due to foreign key constraints)
+            if not mock:
+                refunded_customers.update(row[0] for row in cursor.execute(
+                    "SELECT CustomerId FROM Invoice WHERE InvoiceId = ?", (invoice_id,)))
                 cursor.execute(
                     """
-                    SELECT Total
+                    DELETE
+                    FROM InvoiceLine
+                    WHERE InvoiceId = ?
+                    """,
+                    (invoice_id,),
+                )
+
+                # Then delete the invoice
+                cursor.execute(
+                    """
+                    DELETE
                     FROM Invoice
                     WHERE InvoiceId = ?
                     """,
                     (invoice_id,),
                 )
 
-                result = cursor.fetchone()
-                if result:
-                    total_refund += result[0]
-
-                # Delete invoice lines first (due to foreign key constraints)
-                if not mock:
-                    cursor.execute(
-                        """
-                        DELETE
-                        FROM InvoiceLine
-                        WHERE InvoiceId = ?
-                        """,
-                        (invoice_id,),
-                    )
-
-                    # Then delete the invoice
-                    cursor.execute(
-                        """
-                        DELETE
-                        FROM Invoice
-                        WHERE InvoiceId = ?
-                        """,
-                        (invoice_id,),
-                    )
-
-            # If specific invoice lines are provided
-            if invoice_line_ids is not None:
-                # Get the total amount for the specified invoice lines
-                placeholders = ",".join(["?" for _ in invoice_line_ids])
+        # If specific invoice lines are provided
+        if invoice_line_ids is not None:
+            # Get the total amount for the specified invoice lines
+            placeholders = ",".join(["?" for _ in invoice_line_ids])
+            cursor.execute(
+                f"""
+                SELECT SUM(UnitPrice * Quantity)
+                FROM InvoiceLine
+                WHERE InvoiceLineId IN ({placeholders})
+            """,
+                invoice_line_ids,
+            )
+
+            result = cursor.fetchone()
+            if result and result[0]:
+                total_refund += result[0]
+
+            if not mock:
+                refunded_customers.update(row[0] for row in cursor.execute(
+                    f"""
+                    SELECT DISTINCT i.CustomerId
+                    FROM InvoiceLine il
+                             JOIN Invoice i ON il.InvoiceId = i.InvoiceId
+                    WHERE il.InvoiceLineId IN ({placeholders})
+                """,
+                    invoice_line_ids,
+                ))
+                # Delete the specified invoice lines
                 cursor.execute(
                     f"""
-                    SELECT SUM(UnitPrice * Quantity)
-                    FROM InvoiceLine
+                    DELETE FROM InvoiceLine
                     WHERE InvoiceLineId IN ({placeholders})
                 """,
                     invoice_line_ids,
                 )
 
-                result = cursor.fetchone()
-                if result and result[0]:
-                    total_refund += result[0]
-
-                if not mock:
-                    # Delete the specified invoice lines
-                    cursor.execute(
-                        f"""
-                        DELETE FROM InvoiceLine
-                        WHERE InvoiceLineId IN ({placeholders})
-                    """,
-                        invoice_line_ids,
-                    )
+        return total_refund
 
-            # Commit the changes
-            conn.commit()
+    def _invoice_refund_batch(self, refunds: list[tuple[int | None, list[int] | None]]) -> list[float | Exception]:
+        """Apply many refunds in one write transaction (a single commit), each isolated by a savepoint.
 
-        except sqlite3.Error as e:
-            # Roll back in case of error
-            conn.rollback()
-            raise e
-
-        finally:
-            # Close the connection
-            conn.close()
+        Returns the total of every refund in order, or the error that rolled that refund back.
+        """
+        results = []
+        refunded_customers = set()
+        with self.db.write() as conn:
+            for invoice_id, invoice_line_ids in refunds:
+                customers = set()
+                conn.execute("SAVEPOINT refund")
+                try:
+                    total = self._apply_refund(conn, invoice_id, invoice_line_ids, False, customers)
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO refund")
+                    results.append(e)
+                else:
+                    refunded_customers.update(customers)
+                    results.append(total)
+                conn.execute("RELEASE refund")
+
+        self.history.invalidate(refunded_customers)
+        return results
+
+    def _invoice_refund_bulk(self, invoice_ids: list[int] | None, invoice_line_id_groups: list[list[int]] | None,
+                             mock: bool = True) -> List[types.TextContent]:
+        """Refund many Invoices and groups of Invoice Lines in a single transaction.
+
+        Totals are computed before anything is deleted. An id repeated across items is refunded (and counted)
+        only for its first item, and lines of invoices refunded in full count towards their invoice only.
 
+        Args:
+            invoice_ids: The Invoices to delete.
+            invoice_line_id_groups: Groups of Invoice Lines to delete, each group gets its own total.
+            mock: If True, do not actually delete the specified Invoice/Invoice Lines. Used for testing purposes.
+        """
+        invoice_ids = list(dict.fromkeys(invoice_ids or []))
+        seen_lines = set()
+        line_groups = []
+        for group in invoice_line_id_groups or []:
+            line_groups.append([line_id for line_id in dict.fromkeys(group) if line_id not in seen_lines])
+            seen_lines.update(group)
+        line_ids = [line_id for group in line_groups for line_id in group]
+        refunded_customers = set()
+
+        # A mock refund only reads, so it never has to wait for the writer
+        with self.db.read() if mock else self.db.write() as conn:
+            invoice_totals = [0.0] * len(invoice_ids)
+            group_totals = [0.0] * len(line_groups)
+            for kind, item, total in conn.execute(BULK_REFUND_TOTALS_QUERY, {
+                "invoice_ids": json.dumps(invoice_ids), "line_groups": json.dumps(line_groups)}):
+                (invoice_totals if kind == "invoice" else group_totals)[item] = total
+
+            if not mock:
+                refunded_customers.update(row[0] for row in conn.execute(
+                    """
+                    SELECT DISTINCT CustomerId
+                    FROM Invoice
+                    WHERE InvoiceId IN (SELECT value FROM json_each(:invoice_ids))
+                       OR InvoiceId IN (SELECT InvoiceId
+                                        FROM InvoiceLine
+                                        WHERE InvoiceLineId IN (SELECT value FROM json_each(:line_ids)))
+                    """,
+                    {"invoice_ids": json.dumps(invoice_ids), "line_ids": json.dumps(line_ids)},
+                ))
+                # Invoice lines first (due to foreign key constraints), then the invoices
+                conn.executemany("DELETE FROM InvoiceLine WHERE InvoiceId = ?", ((i,) for i in invoice_ids))
+                conn.executemany("DELETE FROM Invoice WHERE InvoiceId = ?", ((i,) for i in invoice_ids))
+                conn.executemany("DELETE FROM InvoiceLine WHERE InvoiceLineId = ?", ((i,) for i in line_ids))
+
+        self.history.invalidate(refunded_customers)
+
+        output = {
+            "invoices": [{"invoice_id": invoice_id, "total": total}
+                         for invoice_id, total in zip(invoice_ids, invoice_totals)],
+            "invoice_line_groups": [{"invoice_line_ids": group, "total": total}
+                                    for group, total in zip(line_groups, group_totals)],
+            "total": sum(invoice_totals, 0.0) + sum(group_totals, 0.0),
+        }
         return [types.TextContent(
             type="text",
-            text=str(total_refund)
+            text=json.dumps(output)
         )]
 
-    def _invoice_lookup(
-            self,
-            customer_first_name: str,
-            customer_last_name: str,
-            customer_phone: str,
+    @staticmethod
+    def _invoice_lookup_query(
+            customer_id: int,
             track_name: str | None,
             album_title: str | None,
             artist_name: str | None,
             purchase_date_iso_8601: str | None,
-    ) -> List[types.TextContent]:
-        """Find all of the Invoice Line IDs in the Chinook DB for the given filters."""
-        # Connect to the database
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # Base query joining all necessary tables
-        query = """
+            purchase_date_from: str | None = None,
+            purchase_date_to: str | None = None,
+            denormalized: bool = False,
+    ) -> tuple[str, list]:
+        """Build the SQL and parameters of an invoice lookup, on the PurchaseHistory table if `denormalized`."""
+        if denormalized:
+            # A range scan of the customer's rows
+            query = f"""
+                SELECT InvoiceLineId,
+                       TrackName   as track_name,
+                       ArtistName  as artist_name,
+                       InvoiceDate as purchase_date,
+                       Quantity    as quantity_purchased,
+                       UnitPrice   as price_per_unit
+                FROM {history_table.TABLE}
+                WHERE CustomerId = ? \
+                """
+            columns = {"line": "InvoiceLineId", "track": "TrackName", "album": "AlbumTitle", "artist": "ArtistName",
+                       "date": "InvoiceDate"}
+        else:
+            # Base query joining all necessary tables
+            query = """
                 SELECT il.InvoiceLineId,
                        t.Name        as track_name,
                        art.Name      as artist_name,
                        i.InvoiceDate as purchase_date,
                        il.Quantity   as quantity_purchased,
                        il.UnitPrice  as price_per_unit
-                FROM InvoiceLine il
-                         JOIN Invoice i ON il.InvoiceId = i.InvoiceId
-                         JOIN Customer c ON i.CustomerId = c.CustomerId
+                FROM Invoice i
+                         JOIN InvoiceLine il ON il.InvoiceId = i.InvoiceId
                          JOIN Track t ON il.TrackId = t.TrackId
                          JOIN Album alb ON t.AlbumId = alb.AlbumId
                          JOIN Artist art ON alb.ArtistId = art.ArtistId
-                WHERE c.FirstName = ?
-                  AND c.LastName = ?
-                  AND c.Phone = ? \
+                WHERE i.CustomerId = ? \
                 """
+            columns = {"line": "il.InvoiceLineId", "track": "t.Name", "album": "alb.Title", "artist": "art.Name",
+                       "date": "i.InvoiceDate"}
 
         # Parameters for the query
-        params = [customer_first_name, customer_last_name, customer_phone]
+        params = [customer_id]
 
         # Add optional filters
         if track_name:
-            query += " AND t.Name = ?"
+            query += f" AND {columns['track']} = ?"
             params.append(track_name)
 
         if album_title:
-            query += " AND alb.Title = ?"
+            query += f" AND {columns['album']} = ?"
             params.append(album_title)
 
         if artist_name:
-            query += " AND art.Name = ?"
+            query += f" AND {columns['artist']} = ?"
             params.append(artist_name)
 
+        # Plain comparisons on the column, so the (CustomerId, InvoiceDate) index serves the date range
+        if purchase_date_iso_8601 or purchase_date_from or purchase_date_to:
+            bounds = Invoice._purchase_date_bounds(purchase_date_iso_8601, purchase_date_from, purchase_date_to)
+            if bounds is None:
+                query += " AND 0"
+            else:
+                lower, upper = bounds
+                if lower:
+                    query += f" AND {columns['date']} >= ?"
+                    params.append(lower)
+                if upper:
+                    query += f" AND {columns['date']} < ?"
+                    params.append(upper)
+
+        query += f" ORDER BY {columns['line']}"
+        return query, params
+
+    @staticmethod
+    def _purchase_date_bounds(purchase_date_iso_8601: str | None, purchase_date_from: str | None,
+                              purchase_date_to: str | None) -> tuple[str | None, str | None] | None:
+        """[lower, upper) InvoiceDate bounds meeting both the exact-day and the range filters, or None
+        if a date cannot be parsed (which matches nothing)."""
+        ranges = [day_range(purchase_date_from, purchase_date_to)]
         if purchase_date_iso_8601:
-            query += " AND date(i.InvoiceDate) = date(?)"
-            params.append(purchase_date_iso_8601)
+            ranges.append(day_range(purchase_date_iso_8601, purchase_date_iso_8601))
+        if None in ranges:
+            return None
+        lowers = [lower for lower, _ in ranges if lower]
+        uppers = [upper for _, upper in ranges if upper]
+        return max(lowers, default=None), min(uppers, default=None)
+
+    def _purchase_history(self, customer_id: int) -> list[tuple]:
+        """All invoice lines of a customer, from the history cache when possible."""
+        rows = self.history.get(customer_id)
+        if rows is None:
+            version = self.history.version(customer_id)
+            with self.db.read() as conn:
+                query = PURCHASE_HISTORY_TABLE_QUERY if self.denormalized else PURCHASE_HISTORY_QUERY
+                rows = conn.execute(query, (customer_id,)).fetchall()
+            self.history.put(customer_id, rows, version)
+        return rows
 
-        # Execute query
-        cursor.execute(query, params)
+    def _invoice_lookup(
+            self,
+            customer_first_name: str,
+            customer_last_name: str,
+            customer_phone: str,
+            track_name: str | None,
+            album_title: str | None,
+            artist_name: str | None,
+            purchase_date_iso_8601: str | None,
+            purchase_date_from: str | None = None,
+            purchase_date_to: str | None = None,
+    ) -> List[types.TextContent]:
+        """Find all of the Invoice Line IDs in the Chinook DB for the given filters."""
+        # Names and phone are matched regardless of case and formatting
+        customer_id = self.customers.resolve(customer_first_name, customer_last_name, customer_phone)
+        results = []
+        if customer_id is not None and self.history.enabled:
+            self._check_external_writes()
+            # Filter the customer's cached history in memory, with the same semantics as the SQL below
+            bounds = (None, None)
+            if purchase_date_iso_8601 or purchase_date_from or purchase_date_to:
+                bounds = self._purchase_date_bounds(purchase_date_iso_8601, purchase_date_from, purchase_date_to)
+            if bounds is not None:
+                lower, upper = bounds
+                results = [
+                    row for row in self._purchase_history(customer_id)
+                    if (not track_name or row[1] == track_name)
+                    and (not album_title or row[6] == album_title)
+                    and (not artist_name or row[2] == artist_name)
+                    and (not lower or row[3] >= lower)
+                    and (not upper or row[3] < upper)
+                ]
+        elif customer_id is not None:
+            query, params = self._invoice_lookup_query(
+                customer_id, track_name, album_title, artist_name, purchase_date_iso_8601,
+                purchase_date_from, purchase_date_to, denormalized=self.denormalized,
+            )
 
-        # Fetch results
-        results = cursor.fetchall()
+            # Execute query on a pooled reader and fetch results
+            with self.db.read() as conn:
+                results = conn.execute(query, params).fetchall()
 
         # Convert results to list of dictionaries
         output = []
@@ -201,9 +487,6 @@ class Invoice:
                 }
             )
 
-        # Close connection
-        conn.close()
-
         # return output
         return [types.TextContent(
             type="text",
@@ -212,19 +495,116 @@ class Invoice:
 
 
 class ExternalAgents:
-    def __init__(self, nvidia_api_key, mcp_server_qna_path, inf_url):
-        self.qna_agent = qna_agent.QNAAgent(nvidia_api_key, mcp_server_qna_path, inf_url)
+    def __init__(self, nvidia_api_key, mcp_server_qna_path, inf_url, mcp_server_qna_url=None, qna_pool_size=2,
+                 media_cache: MediaResponseCache | None = None, catalog_check_interval: float = 10.0, fast_path: bool = True):
+        self.qna_agent = qna_agent.QNAAgent(nvidia_api_key, mcp_server_qna_path, inf_url, mcp_server_qna_url,
+                                            pool_size=qna_pool_size)
+        self.router = FastPathRouter(enabled=fast_path)
+        self.media_cache = media_cache
+        self.catalog_check_interval = catalog_check_interval
+        self._catalog_checked_at: float | None = None
+
+    async def start(self):
+        await self.qna_agent.start()
+
+    async def stop(self):
+        await self.qna_agent.stop()
+        if self.media_cache is not None:
+            self.media_cache.close()
+
+    def stats(self) -> dict:
+        return {"qna_pool": self.qna_agent.stats(), "fast_path": self.router.stats()}
+
+    async def _check_catalog(self):
+        """Drop the cache if the catalog QNA answers from has changed, checked at most every interval."""
+        now = time.monotonic()
+        if self._catalog_checked_at is not None and now - self._catalog_checked_at < self.catalog_check_interval:
+            return
+        self._catalog_checked_at = now
+        try:
+            version = await self.qna_agent.catalog_version()
+        except Exception:
+            logger.exception("Could not read the QNA catalog version")
+            return
+        await asyncio.to_thread(self.media_cache.check_catalog, version)
+
+    async def _answer(self, query: str, routed: tuple[str, dict[str, str]] | None,
+                      progress: ProgressReporter | None = None) -> str:
+        """Answer with the single QNA lookup the router resolved the query to, if any, otherwise run the agent."""
+        if routed is not None:
+            tool, arguments = routed
+            if progress is not None:
+                await progress.step(f"Calling {tool}({json.dumps(arguments)})")
+            try:
+                response = await self._lookup_all(tool, arguments)
+            except Exception:
+                logger.exception("Fast path %s%s failed, asking the agent", tool, arguments)
+                self.router.fallback("error")
+            else:
+                # Nothing found may just mean the query was not what it looked like
+                if response is not None:
+                    self.router.hit()
+                    return response
+                self.router.fallback("empty")
+        return await self.qna_agent.run(query, progress)
 
-    async def _media_lookup(self, query) -> List[types.TextContent]:
+    async def _lookup_all(self, tool: str, arguments: dict[str, str]) -> str | None:
+        """Every match of a QNA lookup as one JSON list, following its cursors, or None if nothing matches.
+
+        Past FAST_PATH_MAX_ROWS matches the list is followed by a line stating how many there are.
+        """
+        rows, cursor = [], None
+        while True:
+            page_arguments = {**arguments, "limit": FAST_PATH_PAGE_SIZE}
+            if cursor is not None:
+                page_arguments["cursor"] = cursor
+            page, _, meta = (await self.qna_agent.call_tool(tool, page_arguments)).partition("\n")
+            rows += json.loads(page)
+            if not meta:
+                break
+            meta = json.loads(meta)
+            if len(rows) >= FAST_PATH_MAX_ROWS:
+                more = "+" if meta["total_count_is_lower_bound"] else ""
+                return f"{json.dumps(rows)}\nShowing the first {len(rows)} of {meta['total_count']}{more} matches."
+            cursor = meta["next_cursor"]
+        return json.dumps(rows) if rows else None
+
+    async def _media_lookup(self, query, progress: ProgressReporter | None = None) -> List[types.TextContent]:
         ## TODO
         ## invoke qna agent and return output
-        response = await self.qna_agent.run(query)
+        routed = self.router.match(query)
+        if self.media_cache is None:
+            response = await self._answer(query, routed, progress)
+            return [types.TextContent(type="text", text=response)]
+
+        key = cache_key(query, routed)
+        await self._check_catalog()
+        response = await asyncio.to_thread(self.media_cache.get, key)
+        if response is None:
+            response = await self._answer(query, routed, progress)
+            await asyncio.to_thread(self.media_cache.put, key, response)
         return [types.TextContent(type="text", text=response)]
 
 
-def main(db_path: str, nvidia_api_key: str, mcp_server_qna_path: str, inf_url: str):
-    invoice = Invoice(db_path)
-    external_agent = ExternalAgents(nvidia_api_key, mcp_server_qna_path, inf_url)
+def create_app(db_path: str, nvidia_api_key: str, mcp_server_qna_path: str, inf_url: str, db_workers: int = 8,
+               tool_concurrency: dict[str, int] | None = None, mcp_server_qna_url: str | None = None,
+               db_readers: int = 4, busy_timeout_ms: int = 5000, history_rows: int = 100_000,
+               refund_batch_window_ms: float = 5.0, refund_batch_size: int = 64, qna_pool_size: int = 2,
+               media_cache_path: str | None = None, media_cache_ttl: float = 3600.0,
+               media_cache_max_bytes: int = 16 * 1024 * 1024, media_fast_path: bool = True,
+               sse: bool = False, tool_timeout: float | None = None, debug: bool = False) -> Starlette:
+    """Build the invoice ASGI app with its own DB connections, caches, executor and refund queue."""
+    invoice = Invoice(db_path, readers=db_readers, busy_timeout_ms=busy_timeout_ms, history_rows=history_rows)
+    executor = DBExecutor(max_workers=db_workers, tool_limits={**DEFAULT_TOOL_CONCURRENCY, **(tool_concurrency or {})})
+    refund_queue = RefundQueue(executor, invoice._invoice_refund_batch, window_ms=refund_batch_window_ms,
+                               max_batch=refund_batch_size)
+    media_cache = None
+    if media_cache_path:
+        media_cache = MediaResponseCache(media_cache_path, ttl=media_cache_ttl, max_bytes=media_cache_max_bytes)
+    external_agent = ExternalAgents(nvidia_api_key, mcp_server_qna_path, inf_url, mcp_server_qna_url,
+                                    qna_pool_size=qna_pool_size, media_cache=media_cache, fast_path=media_fast_path)
+    singleflight = SingleFlight()
+    guard = CallGuard()
     mcp = Server("invoice")
 
     @mcp.list_tools()
@@ -244,7 +624,13 @@ def main(db_path: str, nvidia_api_key: str, mcp_server_qna_path: str, inf_url: s
                     "album_title": {"type": "string", "description": "(Optional) Title of the album."},
                     "artist_name": {"type": "string", "description": "(Optional) Name of the artist."},
                     "purchase_date_iso_8601": {"type": "string",
-                                               "description": "(Optional) Purchase date in ISO 8601 format (YYYY-MM-DD)."}
+                                               "description": "(Optional) Purchase date in ISO 8601 format (YYYY-MM-DD)."},
+                    "purchase_date_from": {"type": "string",
+                                           "description": "(Optional) Earliest purchase date, inclusive "
+                                                          "(YYYY-MM-DD, YYYY-MM or YYYY)."},
+                    "purchase_date_to": {"type": "string",
+                                         "description": "(Optional) Latest purchase date, inclusive "
+                                                        "(YYYY-MM-DD, or YYYY-MM / YYYY for the whole month / year)."}
                 },
                 "required": ["customer_first_name", "customer_last_name", "customer_phone"]
             }),
@@ -268,14 +654,58 @@ def main(db_path: str, nvidia_api_key: str, mcp_server_qna_path: str, inf_url: s
                     },
                     "required": []
                 }
+            ),
+            types.Tool(
+                name="invoice_refund_bulk",
+                description="Refund many invoices and groups of invoice lines at once, in a single transaction. "
+                            "Returns the refund total of every invoice and line group plus the grand total.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "invoice_ids": {
+                            "type": "array",
+                            "items": {"type": "integer"},
+                            "description": "(Optional) Invoice IDs to refund in full."
+                        },
+                        "invoice_line_id_groups": {
+                            "type": "array",
+                            "items": {"type": "array", "items": {"type": "integer"}},
+                            "description": "(Optional) Groups of Invoice Line IDs to refund, totalled per group."
+                        },
+                        "mock": {
+                            "type": "boolean",
+                            "description": "If true, do not actually delete records (for testing purposes).",
+                            "default": True
+                        }
+                    },
+                    "required": []
+                }
             )]
 
     @mcp.call_tool()
     async def handle_call_tool(name: str, args: dict[str, Any] | None):
+        if name in READ_ONLY_TOOLS:
+            timeout = request_timeout(mcp.request_context.meta, tool_timeout)
+            return await guard.run(name, lambda: singleflight.do(name, flight_key(name, args),
+                                                                  lambda: call_tool(name, args)), timeout)
+        return await call_tool(name, args)
+
+    def progress_reporter() -> ProgressReporter | None:
+        """Progress notifications for the current request, if the client asked for them with a progress token."""
+        ctx = mcp.request_context
+        token = ctx.meta.progressToken if ctx.meta else None
+        if token is None:
+            return None
+        return ProgressReporter(lambda progress, message: ctx.session.send_progress_notification(
+            token, progress, message=message, related_request_id=ctx.request_id))
+
+    async def call_tool(name: str, args: dict[str, Any] | None):
         ## TODO
         ## implement tool calling logic
         if name == "invoice_lookup":
-            return invoice._invoice_lookup(
+            return await executor.run(
+                name,
+                invoice._invoice_lookup,
                 customer_first_name=args.get("customer_first_name"),
                 customer_last_name=args.get("customer_last_name"),
                 customer_phone=args.get("customer_phone"),
@@ -283,55 +713,118 @@ def main(db_path: str, nvidia_api_key: str, mcp_server_qna_path: str, inf_url: s
                 album_title=args.get("album_title"),
                 artist_name=args.get("artist_name"),
                 purchase_date_iso_8601=args.get("purchase_date_iso_8601"),
+                purchase_date_from=args.get("purchase_date_from"),
+                purchase_date_to=args.get("purchase_date_to"),
             )
+        elif name == "invoice_refund" and not args.get("mock", True):
+            # Real refunds are group-committed with the other refunds arriving within the batch window
+            if args.get("invoice_id") is None and args.get("invoice_line_ids") is None:
+                total_refund = 0.0
+            else:
+                total_refund = await refund_queue.submit(args.get("invoice_id"), args.get("invoice_line_ids"))
+            return [types.TextContent(type="text", text=str(total_refund))]
         elif name == "invoice_refund":
-            return invoice._invoice_refund(
+            return await executor.run(
+                name,
+                invoice._invoice_refund,
                 invoice_id=args.get("invoice_id"),
                 invoice_line_ids=args.get("invoice_line_ids"),
                 mock=args.get("mock", True),
             )
+        elif name == "invoice_refund_bulk":
+            return await executor.run(
+                name,
+                invoice._invoice_refund_bulk,
+                invoice_ids=args.get("invoice_ids"),
+                invoice_line_id_groups=args.get("invoice_line_id_groups"),
+                mock=args.get("mock", True),
+            )
         elif name == "media_lookup":
             query = args.get("query")
             if query:
-                return await external_agent._media_lookup(query)
+                return await external_agent._media_lookup(query, progress_reporter())
             else:
                 return [types.TextContent(type="text", text="Error: 'query' parameter is required for media_lookup.")]
         else:
             return [types.TextContent(type="text", text=f"Error: Unknown tool '{name}'.")]
 
-    # Create the session manager with true stateless mode
+    # Create the session manager with true stateless mode; in SSE mode each tool call response is a stream
+    # that carries the progress notifications of the call before its result
     session_manager = StreamableHTTPSessionManager(
         app=mcp,
         event_store=None,
-        json_response=True,
+        json_response=not sse,
         stateless=True,
     )
 
+    @watch_disconnect
     async def handle_streamable_http(
             scope: Scope, receive: Receive, send: Send
     ) -> None:
         await session_manager.handle_request(scope, receive, send)
 
+    async def handle_stats(request: Request) -> JSONResponse:
+        agents = external_agent.stats()
+        if media_cache is not None:
+            # Queries the cache's SQLite file
+            agents["media_cache"] = await executor.run("stats", media_cache.stats)
+        return JSONResponse({
+            "executor": executor.stats(),
+            "db": invoice.stats(),
+            "refund_queue": refund_queue.stats(),
+            "singleflight": singleflight.stats(),
+            "deadlines": guard.stats(),
+            "agents": agents,
+        })
+
     @contextlib.asynccontextmanager
     async def lifespan(app: Starlette) -> AsyncIterator[None]:
         """Context manager for session manager."""
         async with session_manager.run():
+            refund_queue.start()
+            await external_agent.start()
             logger.info("Application started with StreamableHTTP session manager!")
             try:
                 yield
             finally:
                 logger.info("Application shutting down...")
+                await refund_queue.stop()
+                await external_agent.stop()
+                executor.shutdown()
+                invoice.close()
 
     # Create an ASGI application using the transport
-    starlette_app = Starlette(
-        debug=True,
+    return Starlette(
+        debug=debug,
         routes=[
             Mount("/mcp", app=handle_streamable_http),
+            Route("/stats", endpoint=handle_stats),
         ],
         lifespan=lifespan,
     )
 
-    uvicorn.run(starlette_app, host="127.0.0.1")
+
+def create_app_from_env() -> Starlette:
+    """App factory run by every uvicorn worker process, so each worker opens its own DB connections."""
+    return create_app(**json.loads(os.environ[APP_CONFIG_ENV]))
+
+
+def main(db_path: str, nvidia_api_key: str, mcp_server_qna_path: str, inf_url: str, host: str = "127.0.0.1",
+         port: int = 8000, uds: str | None = None, workers: int = 1, **options):
+    """Serve the invoice server; with several workers each one is a separate process sharing the socket."""
+    config = dict(db_path=db_path, nvidia_api_key=nvidia_api_key, mcp_server_qna_path=mcp_server_qna_path,
+                  inf_url=inf_url, **options)
+    # "auto" picks uvloop and httptools when they are installed (the 'fast' extra)
+    server_options = dict(host=host, port=port, uds=uds, loop="auto", http="auto")
+    logger.info("Serving with %d worker(s), uvloop %s, httptools %s", workers,
+                "on" if importlib.util.find_spec("uvloop") else "off",
+                "on" if importlib.util.find_spec("httptools") else "off")
+    if workers > 1:
+        # Workers are spawned processes that import the app factory, so the configuration goes through the env
+        os.environ[APP_CONFIG_ENV] = json.dumps(config)
+        uvicorn.run(f"{__name__}:create_app_from_env", factory=True, workers=workers, **server_options)
+    else:
+        uvicorn.run(create_app(**config), **server_options)
 
 
 class ServerWrapper():
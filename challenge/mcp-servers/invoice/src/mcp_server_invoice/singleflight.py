@@ -0,0 +1,80 @@
+import asyncio
+import json
+from collections import defaultdict
+
+from .refunds import Histogram
+
+SAVED_CALLS_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def flight_key(name: str, args: dict | None) -> str:
+    """Tool name plus its arguments with unset ones dropped and keys sorted."""
+    args = {key: value for key, value in (args or {}).items() if value is not None}
+    return json.dumps([name, args], sort_keys=True, separators=(",", ":"))
+
+
+class Flight:
+    def __init__(self, tool: str, task: asyncio.Task):
+        self.tool = tool
+        self.task = task
+        self.waiters = 0
+        self.shared = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls: the first call runs, the ones arriving while it is in
+    flight wait for its result (or exception) instead of running again.
+
+    The call runs in its own task, so a caller that is cancelled does not cancel it for the others;
+    it is cancelled only once every caller waiting for it has gone. Only pass side-effect free calls.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, Flight] = {}
+        self.flights = defaultdict(int)
+        self.saved = defaultdict(int)
+        self.cancelled = defaultdict(int)
+        self.saved_per_flight = defaultdict(lambda: Histogram(SAVED_CALLS_BUCKETS))
+
+    async def do(self, tool: str, key: str, call):
+        """Await `call()`, or the identical call with the same key already in flight."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = Flight(tool, asyncio.create_task(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._land(key, flight))
+        else:
+            flight.shared += 1
+            self.saved[tool] += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is waiting for it any more; later callers start a new flight
+                flight.task.cancel()
+                self._land(key, flight)
+
+    def _land(self, key: str, flight: Flight):
+        if self._flights.get(key) is not flight:
+            return
+        del self._flights[key]
+        self.flights[flight.tool] += 1
+        if flight.task.cancelled() or not flight.task.done():
+            self.cancelled[flight.tool] += 1
+        self.saved_per_flight[flight.tool].observe(flight.shared)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "tools": {
+                tool: {
+                    "flights": self.flights[tool],
+                    "saved_calls": self.saved[tool],
+                    "cancelled": self.cancelled[tool],
+                    "saved_per_flight": self.saved_per_flight[tool].stats(),
+                }
+                for tool in sorted(self.flights)
+            },
+        }
@@ -0,0 +1,46 @@
+import json
+import shutil
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from mcp_server_invoice.server_http import Invoice
+
+CHINOOK_DB = Path(__file__).resolve().parents[1] / "data" / "chinook.db"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A copy of the Chinook DB the test may write to."""
+    path = tmp_path / "chinook.db"
+    shutil.copyfile(CHINOOK_DB, path)
+    return path
+
+
+@pytest.fixture
+def make_invoice():
+    """Open Invoice instances, closed at teardown."""
+    opened = []
+
+    def make(db_path, **kwargs):
+        invoice = Invoice(db_path, **kwargs)
+        opened.append(invoice)
+        return invoice
+
+    yield make
+    for invoice in opened:
+        invoice.close()
+
+
+def lookup(invoice: Invoice, customer_id: int, **filters) -> list[dict]:
+    """invoice_lookup for the customer with `customer_id`, identified by name and phone as an agent would."""
+    conn = sqlite3.connect(invoice.db_path)
+    try:
+        first_name, last_name, phone = conn.execute(
+            "SELECT FirstName, LastName, Phone FROM Customer WHERE CustomerId = ?", (customer_id,)).fetchone()
+    finally:
+        conn.close()
+    arguments = {"track_name": None, "album_title": None, "artist_name": None, "purchase_date_iso_8601": None}
+    content = invoice._invoice_lookup(first_name, last_name, phone, **{**arguments, **filters})
+    return json.loads(content[0].text)
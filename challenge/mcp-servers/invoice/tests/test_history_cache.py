@@ -0,0 +1,83 @@
+import sqlite3
+
+from mcp_server_invoice.history import CustomerHistoryCache
+
+from conftest import lookup
+
+
+def test_cache_is_bounded_by_rows_and_evicts_least_recently_used():
+    cache = CustomerHistoryCache(max_rows=5)
+    for customer_id in (1, 2):
+        cache.put(customer_id, [(customer_id,)] * 2, cache.version(customer_id))
+    cache.get(1)
+    cache.put(3, [(3,)] * 2, cache.version(3))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+    assert cache.stats()["rows"] == 4 and cache.stats()["evictions"] == 1
+
+
+def test_history_invalidated_while_being_read_is_not_stored():
+    cache = CustomerHistoryCache()
+    version = cache.version(1)
+    cache.invalidate([1])
+    cache.put(1, [(1,)], version)
+    assert cache.get(1) is None
+
+
+def test_cached_filters_match_sql_filters(make_invoice, db_path):
+    cached = make_invoice(db_path)
+    uncached = make_invoice(db_path, history_rows=0)
+    purchases = lookup(uncached, 1)
+    first, last = purchases[0], purchases[-1]
+    conn = sqlite3.connect(db_path)
+    album_title = conn.execute("SELECT Title FROM Album JOIN Track USING (AlbumId) WHERE Track.Name = ?",
+                               (first["track_name"],)).fetchone()[0]
+    conn.close()
+
+    for filters in [
+        {},
+        {"track_name": first["track_name"]},
+        {"album_title": album_title},
+        {"artist_name": last["artist_name"]},
+        {"purchase_date_iso_8601": first["purchase_date"][:10]},
+        {"purchase_date_from": first["purchase_date"][:7], "purchase_date_to": last["purchase_date"][:4]},
+        {"purchase_date_iso_8601": "not a date"},
+    ]:
+        assert lookup(cached, 1, **filters) == lookup(uncached, 1, **filters), filters
+    assert cached.history.stats()["hits"] > 0
+
+
+def test_refund_drops_only_the_refunded_customers_history(make_invoice, db_path):
+    invoice = make_invoice(db_path)
+    before = lookup(invoice, 1)
+    other = lookup(invoice, 2)
+    refunded = before[0]["invoice_line_id"]
+
+    invoice._invoice_refund(None, [refunded], mock=False)
+
+    assert 1 not in invoice.history._entries and 2 in invoice.history._entries
+    assert lookup(invoice, 1) == before[1:]
+    hits = invoice.history.stats()["hits"]
+    assert lookup(invoice, 2) == other
+    assert invoice.history.stats()["hits"] == hits + 1
+
+
+def test_mock_refund_keeps_the_history(make_invoice, db_path):
+    invoice = make_invoice(db_path)
+    before = lookup(invoice, 1)
+    invoice._invoice_refund(None, [before[0]["invoice_line_id"]], mock=True)
+    assert 1 in invoice.history._entries
+    assert lookup(invoice, 1) == before
+
+
+def test_external_write_clears_the_cache(make_invoice, db_path):
+    invoice = make_invoice(db_path)
+    invoice.external_check_interval = 0
+    before = lookup(invoice, 1)
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("DELETE FROM InvoiceLine WHERE InvoiceLineId = ?", (before[0]["invoice_line_id"],))
+    conn.close()
+
+    assert lookup(invoice, 1) == before[1:]
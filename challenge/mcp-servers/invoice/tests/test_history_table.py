@@ -0,0 +1,78 @@
+import shutil
+import sqlite3
+
+import pytest
+
+from mcp_server_invoice import history_table
+
+from conftest import lookup
+from test_refunds import invoice_lines
+
+
+@pytest.fixture
+def denormalized_db_path(db_path):
+    history_table.rebuild(str(db_path))
+    return db_path
+
+
+def assert_in_sync(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        table = conn.execute(f"SELECT * FROM {history_table.TABLE} ORDER BY CustomerId, InvoiceLineId").fetchall()
+        source = conn.execute(history_table.SOURCE_ROWS.format(where="1") + " ORDER BY 1, 2").fetchall()
+    finally:
+        conn.close()
+    assert table == source
+
+
+def test_rebuild_installs_the_table_and_triggers(denormalized_db_path, make_invoice):
+    assert_in_sync(denormalized_db_path)
+    assert make_invoice(denormalized_db_path).denormalized
+
+
+@pytest.mark.parametrize("refund", [
+    lambda invoice, db_path: invoice._invoice_refund(None, invoice_lines(db_path, 1)[:2], mock=False),
+    lambda invoice, db_path: invoice._invoice_refund(1, None, mock=False),
+    lambda invoice, db_path: invoice._invoice_refund_bulk([1, 2], [invoice_lines(db_path, 3)[:1]], mock=False),
+    lambda invoice, db_path: invoice._invoice_refund_batch([(1, None), (None, invoice_lines(db_path, 3))]),
+], ids=["lines", "invoice", "bulk", "batch"])
+def test_refunds_keep_the_table_in_sync(denormalized_db_path, make_invoice, refund):
+    invoice = make_invoice(denormalized_db_path)
+    refund(invoice, denormalized_db_path)
+    assert_in_sync(denormalized_db_path)
+
+
+def test_catalog_edits_and_new_purchases_keep_the_table_in_sync(denormalized_db_path):
+    conn = sqlite3.connect(denormalized_db_path)
+    with conn:
+        conn.execute("UPDATE Track SET Name = Name || ' (Remastered)' WHERE TrackId = 1")
+        conn.execute("UPDATE Album SET Title = upper(Title) WHERE AlbumId = 1")
+        conn.execute("UPDATE Artist SET Name = 'AC-DC' WHERE ArtistId = 1")
+        conn.execute("UPDATE Invoice SET CustomerId = 2 WHERE InvoiceId = 1")
+        invoice_id = conn.execute(
+            "INSERT INTO Invoice (CustomerId, InvoiceDate, Total) VALUES (1, '2014-01-01 00:00:00', 1.98)").lastrowid
+        conn.execute("INSERT INTO InvoiceLine (InvoiceId, TrackId, UnitPrice, Quantity) VALUES (?, 1, 0.99, 2)",
+                     (invoice_id,))
+    conn.close()
+    assert_in_sync(denormalized_db_path)
+
+
+def test_lookups_match_the_joined_tables(denormalized_db_path, tmp_path, make_invoice):
+    joined_db_path = tmp_path / "joined.db"
+    shutil.copyfile(denormalized_db_path, joined_db_path)
+    conn = sqlite3.connect(joined_db_path)
+    with conn:
+        for name, _, _ in history_table.TRIGGERS:
+            conn.execute(f"DROP TRIGGER {history_table.TABLE}_{name}")
+        conn.execute(f"DROP TABLE {history_table.TABLE}")
+    conn.close()
+
+    denormalized = make_invoice(denormalized_db_path, history_rows=0)
+    joined = make_invoice(joined_db_path, history_rows=0)
+    assert denormalized.denormalized and not joined.denormalized
+    for invoice in (denormalized, joined):
+        invoice._invoice_refund(None, invoice_lines(invoice.db_path, 1)[:1], mock=False)
+
+    for filters in [{}, {"artist_name": "AC/DC"}, {"purchase_date_from": "2010", "purchase_date_to": "2011-06"}]:
+        for customer_id in (1, 2, 30):
+            assert lookup(denormalized, customer_id, **filters) == lookup(joined, customer_id, **filters)
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import shutil
+import sqlite3
+
+import pytest
+
+from mcp_server_invoice.executor import DBExecutor
+from mcp_server_invoice.refunds import RefundQueue
+
+
+def invoice_lines(db_path, invoice_id: int) -> list[int]:
+    conn = sqlite3.connect(db_path)
+    try:
+        return [line_id for (line_id,) in conn.execute(
+            "SELECT InvoiceLineId FROM InvoiceLine WHERE InvoiceId = ? ORDER BY InvoiceLineId", (invoice_id,))]
+    finally:
+        conn.close()
+
+
+def remaining(db_path) -> tuple[list, list]:
+    """The ids of every invoice and invoice line left in the DB."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return ([row for row in conn.execute("SELECT InvoiceId FROM Invoice ORDER BY 1")],
+                [row for row in conn.execute("SELECT InvoiceLineId FROM InvoiceLine ORDER BY 1")])
+    finally:
+        conn.close()
+
+
+def single_refund(invoice, invoice_id, invoice_line_ids, mock=False) -> float:
+    return float(invoice._invoice_refund(invoice_id, invoice_line_ids, mock=mock)[0].text)
+
+
+@pytest.fixture
+def other_db_path(db_path, tmp_path):
+    """A second copy of the Chinook DB, to compare two ways of refunding the same items."""
+    path = tmp_path / "other.db"
+    shutil.copyfile(db_path, path)
+    return path
+
+
+@pytest.mark.parametrize("mock", [True, False])
+def test_bulk_refund_totals_match_single_refunds(make_invoice, db_path, other_db_path, mock):
+    invoice_ids = [1, 2]
+    line_groups = [invoice_lines(db_path, 3)[:2], invoice_lines(db_path, 5)]
+
+    bulk = json.loads(make_invoice(db_path)._invoice_refund_bulk(invoice_ids, line_groups, mock=mock)[0].text)
+
+    one_by_one = make_invoice(other_db_path)
+    invoice_totals = [single_refund(one_by_one, invoice_id, None, mock) for invoice_id in invoice_ids]
+    group_totals = [single_refund(one_by_one, None, group, mock) for group in line_groups]
+    assert [item["total"] for item in bulk["invoices"]] == pytest.approx(invoice_totals)
+    assert [item["total"] for item in bulk["invoice_line_groups"]] == pytest.approx(group_totals)
+    assert bulk["total"] == pytest.approx(sum(invoice_totals) + sum(group_totals))
+    assert remaining(db_path) == remaining(other_db_path)
+
+
+def test_bulk_refund_counts_repeated_items_once(make_invoice, db_path, other_db_path):
+    lines, line = invoice_lines(db_path, 1), invoice_lines(db_path, 3)[0]
+    bulk = json.loads(make_invoice(db_path)._invoice_refund_bulk(
+        [1, 1], [lines[:1], lines, [line, line]], mock=False)[0].text)
+
+    one_by_one = make_invoice(other_db_path)
+    expected = single_refund(one_by_one, 1, None) + single_refund(one_by_one, None, [line])
+    assert bulk["total"] == pytest.approx(expected)
+    assert remaining(db_path) == remaining(other_db_path)
+
+
+def test_grouped_refund_totals_match_single_refunds(make_invoice, db_path, other_db_path):
+    refunds = [(1, None), (None, invoice_lines(db_path, 3)[:2]), (2, invoice_lines(db_path, 5)), (None, [10 ** 9])]
+    invoice = make_invoice(db_path)
+
+    async def submit_all():
+        executor = DBExecutor()
+        queue = RefundQueue(executor, invoice._invoice_refund_batch, window_ms=50)
+        queue.start()
+        try:
+            return await asyncio.gather(*(queue.submit(*refund) for refund in refunds)), queue.stats()
+        finally:
+            await queue.stop()
+            executor.shutdown()
+
+    totals, stats = asyncio.run(submit_all())
+
+    one_by_one = make_invoice(other_db_path)
+    assert totals == pytest.approx([single_refund(one_by_one, *refund) for refund in refunds])
+    assert stats["batch_size"]["count"] == 1
+    assert remaining(db_path) == remaining(other_db_path)
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from mcp_server_invoice.singleflight import SingleFlight, flight_key
+
+
+class Call:
+    """A tool call that blocks until released, counting how many times it ran."""
+
+    def __init__(self, result="result"):
+        self.result = result
+        self.runs = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.runs += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def test_key_ignores_argument_order_and_unset_arguments():
+    key = flight_key("invoice_lookup", {"a": 1, "b": None, "c": "x"})
+    assert key == flight_key("invoice_lookup", {"c": "x", "a": 1})
+    assert flight_key("invoice_lookup", {"a": 1}) != flight_key("media_lookup", {"a": 1})
+    assert flight_key("invoice_lookup", {"a": 1}) != flight_key("invoice_lookup", {"a": 2})
+
+
+def test_identical_concurrent_calls_share_one_run():
+    async def main():
+        flights = SingleFlight()
+        call, other = Call("first"), Call("other")
+        tasks = [asyncio.create_task(flights.do("tool", "key", call)) for _ in range(3)]
+        tasks.append(asyncio.create_task(flights.do("tool", "other key", other)))
+        await asyncio.sleep(0)
+        call.release.set()
+        other.release.set()
+        results = await asyncio.gather(*tasks)
+        return flights, call, other, results
+
+    flights, call, other, results = asyncio.run(main())
+    assert results == ["first"] * 3 + ["other"]
+    assert call.runs == 1 and other.runs == 1
+    stats = flights.stats()
+    assert stats["in_flight"] == 0
+    assert stats["tools"]["tool"]["flights"] == 2 and stats["tools"]["tool"]["saved_calls"] == 2
+
+
+def test_exception_reaches_every_waiter_and_is_not_kept():
+    async def main():
+        flights = SingleFlight()
+        call = Call(RuntimeError("boom"))
+        tasks = [asyncio.create_task(flights.do("tool", "key", call)) for _ in range(2)]
+        await asyncio.sleep(0)
+        call.release.set()
+        errors = await asyncio.gather(*tasks, return_exceptions=True)
+        retry = Call("ok")
+        retry.release.set()
+        return errors, await flights.do("tool", "key", retry)
+
+    errors, retried = asyncio.run(main())
+    assert [str(error) for error in errors] == ["boom", "boom"]
+    assert retried == "ok"
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def main():
+        flights = SingleFlight()
+        call = Call()
+        leaving = asyncio.create_task(flights.do("tool", "key", call))
+        staying = asyncio.create_task(flights.do("tool", "key", call))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        call.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return call, await staying
+
+    call, result = asyncio.run(main())
+    assert result == "result"
+    assert call.runs == 1 and not call.cancelled
+
+
+def test_call_is_cancelled_once_every_caller_has_gone():
+    async def main():
+        flights = SingleFlight()
+        call = Call()
+        tasks = [asyncio.create_task(flights.do("tool", "key", call)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+        # The next identical call starts a new flight instead of joining the cancelled one
+        fresh = Call("fresh")
+        fresh.release.set()
+        return flights, call, await flights.do("tool", "key", fresh)
+
+    flights, call, result = asyncio.run(main())
+    assert call.cancelled
+    assert result == "fresh"
+    assert flights.stats()["tools"]["tool"]["cancelled"] == 1
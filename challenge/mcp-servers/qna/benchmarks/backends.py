@@ -0,0 +1,65 @@
+"""Compare QNA lookup latency across backends on the same queries.
+
+    uv run python benchmarks/backends.py --db-path data/chinook.db --repeat 200
+"""
+import argparse
+import statistics
+import time
+
+from mcp_server_qna.server import QNA
+
+QUERIES = [
+    ("_lookup_track", {"artist_name": "AC/DC"}),
+    ("_lookup_track", {"artist_name": "Led Zeppelin", "track_name": "Stairway"}),
+    ("_lookup_track", {"album_title": "Greatest Hits"}),
+    ("_lookup_track", {"track_name": "love"}),
+    ("_lookup_album", {"artist_name": "Iron Maiden"}),
+    ("_lookup_album", {"track_name": "Black Dog"}),
+    ("_lookup_artist", {"track_name": "Yesterday"}),
+    ("_lookup_artist", {"album_title": "Live"}),
+]
+
+
+def bench(qna: QNA, repeat: int) -> dict[str, list[float]]:
+    timings = {}
+    for method, filters in QUERIES:
+        lookup = getattr(qna, method)
+        lookup(**filters)  # warm up
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            lookup(**filters)
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[f"{method[len('_lookup_'):]} {filters}"] = samples
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='QNA backend benchmark')
+    parser.add_argument('--db-path', default="data/chinook.db", help='Path to SQLite database file')
+    parser.add_argument('--repeat', type=int, default=100, help='Runs per query')
+    args = parser.parse_args()
+
+    backends = {
+        "sqlite (like)": QNA(args.db_path, fts=False, fuzzy=False),
+        "sqlite (fts)": QNA(args.db_path, fuzzy=False),
+        "memory": QNA(args.db_path, fuzzy=False, backend="memory"),
+    }
+    results = {name: bench(qna, args.repeat) for name, qna in backends.items()}
+
+    print(f"{'query':<62}" + "".join(f"{name:>22}" for name in results))
+    for query in next(iter(results.values())):
+        cells = []
+        for timings in results.values():
+            samples = sorted(timings[query])
+            p95 = samples[int(len(samples) * 0.95) - 1]
+            cells.append(f"{statistics.median(samples):8.3f} / {p95:8.3f} ms")
+        print(f"{query[:60]:<62}" + "".join(f"{cell:>22}" for cell in cells))
+    print("(median / p95)")
+
+    for qna in backends.values():
+        qna.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Time every filter shape of the LIKE lookups: the generated semi-join SQL against the join-and-group form it replaced.
+
+    uv run python benchmarks/shapes.py --db-path data/chinook.db --repeat 200
+"""
+import argparse
+import itertools
+import sqlite3
+import statistics
+import time
+
+from mcp_server_qna.query import FILTER_KEYS, SELECTS, like_params, like_query
+
+SAMPLE_FILTERS = {"track_name": "love", "album_title": "live", "artist_name": "a"}
+
+JOINS = {
+    "lookup_track": ("""
+                FROM Track t
+                         JOIN Album al ON t.AlbumId = al.AlbumId
+                         JOIN Artist ar ON al.ArtistId = ar.ArtistId""", "t.Name, ar.Name, al.Title"),
+    "lookup_album": ("""
+                FROM Album al
+                         JOIN Artist ar ON al.ArtistId = ar.ArtistId
+                         LEFT JOIN Track t ON t.AlbumId = al.AlbumId""", "al.AlbumId"),
+    "lookup_artist": ("""
+                FROM Artist ar
+                         LEFT JOIN Album al ON al.ArtistId = ar.ArtistId
+                         LEFT JOIN Track t ON t.AlbumId = al.AlbumId""", "ar.ArtistId"),
+}
+COLUMNS = {"track_name": "t.Name", "album_title": "al.Title", "artist_name": "ar.Name"}
+
+
+def join_query(tool: str, present: tuple[str, ...]) -> tuple[str, list]:
+    """The previous LIKE lookup: join every table and collapse the fan-out with GROUP BY."""
+    source, group_by = JOINS[tool]
+    where = " AND ".join(f"{COLUMNS[key]} LIKE ?" for key in present) or "1 = 1"
+    return f"{SELECTS[tool]}{source} WHERE {where} GROUP BY {group_by}", like_params(present, SAMPLE_FILTERS)
+
+
+def semi_join_query(tool: str, present: tuple[str, ...]) -> tuple[str, list]:
+    query, keys = like_query(tool, present)
+    return query, like_params(keys, SAMPLE_FILTERS)
+
+
+def bench(conn: sqlite3.Connection, query: str, params: list, repeat: int) -> list[float]:
+    # The same first page the server fetches
+    paged = f"SELECT * FROM ({query}) ORDER BY k0 LIMIT 51"
+    conn.execute(paged, params).fetchall()  # warm up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(paged, params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summary(samples: list[float]) -> str:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    return f"{statistics.median(samples):8.3f} / {p95:8.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='QNA query shape benchmark')
+    parser.add_argument('--db-path', default="data/chinook.db", help='Path to SQLite database file')
+    parser.add_argument('--repeat', type=int, default=100, help='Runs per query')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path)
+    print(f"{'shape':<52}{'join':>24}{'semi-join':>24}")
+    for tool in SELECTS:
+        for n in range(len(FILTER_KEYS) + 1):
+            for present in itertools.combinations(FILTER_KEYS, n):
+                cells = [summary(bench(conn, *build(tool, present), args.repeat))
+                         for build in (join_query, semi_join_query)]
+                name = f"{tool} [{', '.join(present) or 'no filters'}]"
+                print(f"{name:<52}" + "".join(f"{cell:>24}" for cell in cells))
+    print(f"(median / p95, filters {SAMPLE_FILTERS})")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,79 @@
+from . import migrate
 from . import server
+from . import server_http
 import asyncio
 import argparse
 
 def main():
     parser = argparse.ArgumentParser(description='QNA MCP Server')
+    parser.add_argument('command',
+                       nargs='?',
+                       choices=['serve', 'migrate'],
+                       default='serve',
+                       help='Run the server (default) or create the covering indexes in --db-path')
     parser.add_argument('--db-path', 
                        default="data/chinook.db",
                        help='Path to SQLite database file')
+    parser.add_argument('--transport',
+                       choices=['stdio', 'http'],
+                       default='stdio',
+                       help='Serve over stdio (one process per client) or streamable HTTP (shared instance)')
+    parser.add_argument('--host',
+                       default="127.0.0.1",
+                       help='Host to bind with --transport http')
+    parser.add_argument('--port',
+                       type=int,
+                       default=8001,
+                       help='Port to bind with --transport http')
+    parser.add_argument('--backend',
+                       choices=server.BACKENDS,
+                       default="sqlite",
+                       help='Serve lookups from SQLite or from an in-memory NumPy snapshot of the catalog')
+    parser.add_argument('--pool-size',
+                       type=int,
+                       default=4,
+                       help='Number of read-only database connections kept open')
+    parser.add_argument('--no-fts',
+                       action='store_true',
+                       help='Disable the FTS5 catalog index and use LIKE lookups only')
+    parser.add_argument('--no-fuzzy',
+                       action='store_true',
+                       help='Disable trigram spelling correction for lookups that match nothing')
+    parser.add_argument('--cache-size',
+                       type=int,
+                       default=1024,
+                       help='Maximum number of cached lookup results (0 disables the cache)')
+    parser.add_argument('--cache-ttl',
+                       type=float,
+                       default=300.0,
+                       help='Seconds a cached lookup result stays valid')
+    parser.add_argument('--db-workers',
+                       type=int,
+                       default=None,
+                       help='Threads running database lookups off the event loop (default: --pool-size)')
+    parser.add_argument('--tool-concurrency',
+                       action='append',
+                       default=[],
+                       metavar='TOOL=N',
+                       help='Maximum concurrent calls of one tool, e.g. lookup_tracks_batch=2 (repeatable)')
     args = parser.parse_args()
-    
-    # stdio MCP server
-    asyncio.run(server.main(args.db_path))
+    if args.command == 'migrate':
+        migrate.migrate(args.db_path)
+        return
 
-__all__ = ['main','server']
\ No newline at end of file
+    tool_concurrency = {}
+    for limit in args.tool_concurrency:
+        tool, _, n = limit.partition('=')
+        tool_concurrency[tool] = int(n)
+    options = dict(pool_size=args.pool_size, fts=not args.no_fts, fuzzy=not args.no_fuzzy, backend=args.backend,
+                   cache_size=args.cache_size, cache_ttl=args.cache_ttl, db_workers=args.db_workers,
+                   tool_concurrency=tool_concurrency)
+
+    if args.transport == 'http':
+        # streamable http MCP server
+        server_http.main(args.db_path, host=args.host, port=args.port, **options)
+    else:
+        # stdio MCP server
+        asyncio.run(server.main(args.db_path, **options))
+
+__all__ = ['main','migrate','server','server_http']
\ No newline at end of file
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Deliberately the same as mcp-servers/invoice/src/mcp_server_invoice/executor.py: the two servers are packaged
+# separately and share no code, so a change to one copy goes into the other as well.
+class DBExecutor:
+    """Runs blocking database calls on a dedicated, bounded thread pool instead of the event loop.
+
+    Each tool additionally gets its own concurrency limit (defaulting to the pool size), so one
+    expensive tool cannot occupy every worker thread. Calls waiting for a tool slot or a free
+    thread are counted as queued.
+    """
+
+    def __init__(self, max_workers: int = 4, tool_limits: dict[str, int] | None = None):
+        self.max_workers = max_workers
+        self.tool_limits = dict(tool_limits or {})
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.max_queue_depth = 0
+        self.completed = defaultdict(int)
+        self.failed = defaultdict(int)
+        self.queue_wait_ms = defaultdict(float)
+
+    def _semaphore(self, tool: str) -> asyncio.Semaphore:
+        if tool not in self._semaphores:
+            self._semaphores[tool] = asyncio.Semaphore(self.tool_limits.get(tool, self.max_workers))
+        return self._semaphores[tool]
+
+    async def run(self, tool: str, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` on the pool under `tool`'s concurrency limit and return its result."""
+        queued_at = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        state = "queued"
+
+        def call():
+            nonlocal state
+            with self._lock:
+                if state != "queued":
+                    # The caller gave up while this call was waiting for a thread
+                    return None
+                state = "running"
+                self.queued -= 1
+                self.running += 1
+                self.queue_wait_ms[tool] += (time.perf_counter() - queued_at) * 1000
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        try:
+            async with self._semaphore(tool):
+                result = await asyncio.get_running_loop().run_in_executor(self._pool, call)
+        except BaseException:
+            with self._lock:
+                if state == "queued":
+                    state = "abandoned"
+                    self.queued -= 1
+                self.failed[tool] += 1
+            raise
+        with self._lock:
+            self.completed[tool] += 1
+        return result
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            tools = set(self.completed) | set(self.failed)
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self.queued,
+                "max_queue_depth": self.max_queue_depth,
+                "running": self.running,
+                "tools": {
+                    tool: {
+                        "limit": self.tool_limits.get(tool, self.max_workers),
+                        "completed": self.completed[tool],
+                        "failed": self.failed[tool],
+                        "avg_queue_wait_ms": self.queue_wait_ms[tool] / max(1, self.completed[tool] + self.failed[tool]),
+                    }
+                    for tool in sorted(tools)
+                },
+            }
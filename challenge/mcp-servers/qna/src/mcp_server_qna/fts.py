@@ -0,0 +1,123 @@
+import logging
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = "1"
+
+# Trigram queries shorter than this never match, so those lookups fall back to LIKE
+MIN_TERM_LENGTH = 3
+
+COLUMNS = {
+    "track_name": "track_name",
+    "album_title": "album_title",
+    "artist_name": "artist_name",
+}
+
+
+class CatalogIndex:
+    """FTS5 trigram index over the denormalized Artist/Album/Track catalog.
+
+    The index lives in a sidecar SQLite file next to the Chinook DB (`chinook.db.fts` by default)
+    and is rebuilt whenever the source file's size or mtime no longer matches the one recorded
+    at build time. Lookup connections ATTACH it read-only under the `fts` schema.
+    """
+
+    def __init__(self, db_path, index_path=None):
+        self.db_path = str(db_path)
+        self.index_path = str(index_path or f"{self.db_path}.fts")
+
+    def _source_signature(self) -> dict:
+        stat = os.stat(self.db_path)
+        return {"version": INDEX_VERSION, "source_size": str(stat.st_size), "source_mtime_ns": str(stat.st_mtime_ns)}
+
+    def is_stale(self) -> bool:
+        if not os.path.exists(self.index_path):
+            return True
+        try:
+            conn = sqlite3.connect(f"{Path(self.index_path).resolve().as_uri()}?mode=ro", uri=True)
+            try:
+                meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return True
+        return meta != self._source_signature()
+
+    def build(self):
+        """Build the index into a temporary file and atomically move it into place.
+
+        Several QNA processes may build at once: each builds into a file of its own, and one that finishes
+        after another has put an up-to-date index in place drops its copy.
+        """
+        index_path = Path(self.index_path)
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{index_path.name}.", suffix=".tmp", dir=index_path.parent)
+        os.close(fd)
+
+        signature = self._source_signature()
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute("ATTACH DATABASE ? AS src", (f"{Path(self.db_path).resolve().as_uri()}?mode=ro",))
+            conn.execute(
+                """
+                CREATE VIRTUAL TABLE catalog USING fts5(
+                    track_name, album_title, artist_name,
+                    track_id UNINDEXED, album_id UNINDEXED, artist_id UNINDEXED,
+                    tokenize = 'trigram'
+                )
+                """
+            )
+            conn.execute(
+                """
+                INSERT INTO catalog (track_name, album_title, artist_name, track_id, album_id, artist_id)
+                SELECT t.Name, al.Title, ar.Name, t.TrackId, al.AlbumId, ar.ArtistId
+                FROM src.Artist ar
+                         LEFT JOIN src.Album al ON al.ArtistId = ar.ArtistId
+                         LEFT JOIN src.Track t ON t.AlbumId = al.AlbumId
+                """
+            )
+            conn.execute("INSERT INTO catalog(catalog) VALUES ('optimize')")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", signature.items())
+            conn.commit()
+            conn.execute("DETACH DATABASE src")
+        except Exception:
+            conn.close()
+            os.remove(tmp_path)
+            raise
+        conn.close()
+        if not self.is_stale():
+            os.remove(tmp_path)
+            logger.info("Catalog FTS index at %s was built by another process", self.index_path)
+            return
+        os.replace(tmp_path, self.index_path)
+        logger.info("Built catalog FTS index at %s", self.index_path)
+
+    def ensure(self) -> bool:
+        """Make sure an up-to-date index exists. Returns False if FTS5 is not usable here."""
+        try:
+            if self.is_stale():
+                self.build()
+            return True
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Catalog FTS index unavailable, falling back to LIKE lookups: %s", e)
+            return False
+
+    @staticmethod
+    def searchable(filters: dict[str, str | None]) -> bool:
+        """Whether the given filters can be answered by a MATCH query."""
+        terms = [value for value in filters.values() if value]
+        return bool(terms) and all(len(term) >= MIN_TERM_LENGTH for term in terms)
+
+    @staticmethod
+    def match_expression(filters: dict[str, str | None]) -> str:
+        """Build a column-filtered FTS5 query; every term is quoted so it matches as a substring."""
+        terms = []
+        for key, value in filters.items():
+            if value:
+                phrase = value.replace('"', '""')
+                terms.append(f'{COLUMNS[key]} : "{phrase}"')
+        return " AND ".join(terms)
@@ -0,0 +1,71 @@
+import re
+from typing import Iterable
+
+import numpy as np
+
+WORD_RE = re.compile(r"\w+")
+
+
+def trigrams(text: str) -> set[str]:
+    """Casefolded character trigrams of every word, padded like pg_trgm ('  w', ' wo', 'wor', 'ord', 'rd ')."""
+    grams = set()
+    for word in WORD_RE.findall(text.casefold()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """In-process character-trigram inverted index over a set of names.
+
+    Postings are stored CSR-style in NumPy arrays, so scoring a query is a single
+    `bincount` over the postings of its trigrams followed by a vectorized Dice coefficient.
+    """
+
+    def __init__(self, names: Iterable[str | None]):
+        self.names = np.array(sorted({name for name in names if name}), dtype=object)
+        self.folded = np.array([name.casefold() for name in self.names], dtype=str)
+
+        vocab: dict[str, int] = {}
+        postings: list[list[int]] = []
+        gram_counts = np.zeros(len(self.names), dtype=np.int32)
+        for name_id, name in enumerate(self.names):
+            grams = trigrams(name)
+            gram_counts[name_id] = len(grams)
+            for gram in grams:
+                gram_id = vocab.setdefault(gram, len(vocab))
+                if gram_id == len(postings):
+                    postings.append([])
+                postings[gram_id].append(name_id)
+
+        self.vocab = vocab
+        self.gram_counts = gram_counts
+        self.offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(p) for p in postings])
+        self.postings = np.fromiter((name_id for p in postings for name_id in p), dtype=np.int32,
+                                    count=int(self.offsets[-1]))
+
+    def __len__(self):
+        return len(self.names)
+
+    def contains(self, term: str) -> bool:
+        """Whether `term` occurs as a case-insensitive substring of any indexed name."""
+        if not len(self.names):
+            return False
+        return bool((np.char.find(self.folded, term.casefold()) >= 0).any())
+
+    def similarity_search(self, query: str, k: int = 1, threshold: float = 0.3) -> list[tuple[str, float]]:
+        """Return up to `k` (name, score) pairs whose trigram Dice similarity to `query` is at least `threshold`."""
+        gram_ids = [self.vocab[gram] for gram in trigrams(query) if gram in self.vocab]
+        query_count = len(trigrams(query))
+        if not gram_ids or not query_count:
+            return []
+
+        hits = np.concatenate([self.postings[self.offsets[g]:self.offsets[g + 1]] for g in gram_ids])
+        shared = np.bincount(hits, minlength=len(self.names))
+        scores = 2.0 * shared / (query_count + self.gram_counts)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.names[i], float(scores[i])) for i in top if scores[i] >= threshold]
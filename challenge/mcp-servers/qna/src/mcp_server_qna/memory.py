@@ -0,0 +1,118 @@
+import sqlite3
+
+import numpy as np
+
+
+class InternedColumn:
+    """A string column stored as int32 codes into a table of distinct values.
+
+    Substring filters are evaluated once per distinct value on the casefolded table
+    and then broadcast to rows through the codes.
+    """
+
+    def __init__(self, values):
+        table: dict[str | None, int] = {}
+        codes = [table.setdefault(value, len(table)) for value in values]
+        self.codes = np.array(codes, dtype=np.int32)
+        self.values = np.array(list(table), dtype=object)
+        self.folded = np.array([(value or "").casefold() for value in table], dtype=str)
+
+    def contains(self, term: str) -> np.ndarray:
+        """Row mask of values containing `term` case-insensitively (NULLs never match, as with LIKE)."""
+        matches = (np.char.find(self.folded, term.casefold()) >= 0) & (self.values != None)  # noqa: E711
+        return matches[self.codes]
+
+    def __getitem__(self, rows):
+        return self.values[self.codes[rows]]
+
+
+class CatalogSnapshot:
+    """Read-only columnar copy of the Artist, Album and Track tables.
+
+    Foreign keys are resolved to row positions at load time (-1 when the parent row is missing),
+    so the lookups are boolean mask operations instead of joins.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        artists = conn.execute("SELECT ArtistId, Name FROM Artist ORDER BY ArtistId").fetchall()
+        albums = conn.execute("SELECT AlbumId, Title, ArtistId FROM Album ORDER BY AlbumId").fetchall()
+        tracks = conn.execute("SELECT TrackId, Name, AlbumId FROM Track ORDER BY TrackId").fetchall()
+
+        self.artist_id = np.array([row[0] for row in artists], dtype=np.int64)
+        self.artist_name = InternedColumn(row[1] for row in artists)
+
+        self.album_id = np.array([row[0] for row in albums], dtype=np.int64)
+        self.album_title = InternedColumn(row[1] for row in albums)
+        self.album_artist = self._positions(self.artist_id, [row[2] for row in albums])
+
+        self.track_id = np.array([row[0] for row in tracks], dtype=np.int64)
+        self.track_name = InternedColumn(row[1] for row in tracks)
+        self.track_album = self._positions(self.album_id, [row[2] for row in tracks])
+
+    @staticmethod
+    def _positions(ids: np.ndarray, foreign_keys: list[int | None]) -> np.ndarray:
+        keys = np.array([-1 if key is None else key for key in foreign_keys], dtype=np.int64)
+        if not len(ids):
+            return np.full(len(keys), -1, dtype=np.int32)
+        positions = np.minimum(np.searchsorted(ids, keys), len(ids) - 1)
+        return np.where(ids[positions] == keys, positions, -1).astype(np.int32)
+
+    @staticmethod
+    def _lift(mask: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """Gather a parent-row mask onto child rows; children without a parent never match."""
+        return (positions >= 0) & mask[np.maximum(positions, 0)]
+
+    def _masks(self, track_name, album_title, artist_name):
+        artist_mask = np.ones(len(self.artist_id), dtype=bool)
+        if artist_name:
+            artist_mask &= self.artist_name.contains(artist_name)
+
+        album_mask = self._lift(artist_mask, self.album_artist)
+        if album_title:
+            album_mask &= self.album_title.contains(album_title)
+
+        track_mask = self._lift(album_mask, self.track_album)
+        if track_name:
+            track_mask &= self.track_name.contains(track_name)
+        return artist_mask, album_mask, track_mask
+
+    @staticmethod
+    def _distinct(keys, rows) -> list[tuple]:
+        """Prefix each distinct row with the key of its first occurrence, so rows stay in key order."""
+        first = {}
+        for key, row in zip(keys, rows):
+            first.setdefault(row, key)
+        return [(key, *row) for row, key in first.items()]
+
+    def lookup_track(self, track_name=None, album_title=None, artist_name=None) -> list[tuple]:
+        """(track_id, track_name, artist_name, album_name) rows, like the inner Track/Album/Artist join."""
+        _, _, track_mask = self._masks(track_name, album_title, artist_name)
+        rows = np.flatnonzero(track_mask)
+        albums = self.track_album[rows]
+        return self._distinct(self.track_id[rows].tolist(), zip(
+            self.track_name[rows],
+            self.artist_name[self.album_artist[albums]],
+            self.album_title[albums],
+        ))
+
+    def lookup_album(self, track_name=None, album_title=None, artist_name=None) -> list[tuple]:
+        """(album_id, album_name, artist_name) rows; with a track filter an album needs at least one matching track."""
+        _, album_mask, track_mask = self._masks(track_name, album_title, artist_name)
+        if track_name:
+            album_mask = np.zeros(len(self.album_id), dtype=bool)
+            album_mask[self.track_album[track_mask]] = True
+        rows = np.flatnonzero(album_mask)
+        return self._distinct(self.album_id[rows].tolist(),
+                              zip(self.album_title[rows], self.artist_name[self.album_artist[rows]]))
+
+    def lookup_artist(self, track_name=None, album_title=None, artist_name=None) -> list[tuple]:
+        """(artist_id, artist_name) rows; album and track filters require a matching album (and track) of the artist."""
+        artist_mask, album_mask, track_mask = self._masks(track_name, album_title, artist_name)
+        if track_name:
+            artist_mask = np.zeros(len(self.artist_id), dtype=bool)
+            artist_mask[self.album_artist[self.track_album[track_mask]]] = True
+        elif album_title:
+            artist_mask = np.zeros(len(self.artist_id), dtype=bool)
+            artist_mask[self.album_artist[album_mask]] = True
+        rows = np.flatnonzero(artist_mask)
+        return self._distinct(self.artist_id[rows].tolist(), ((name,) for name in self.artist_name[rows]))
@@ -0,0 +1,64 @@
+import itertools
+import sqlite3
+
+from .server import FILTER_KEYS, QNA
+
+# Covering indexes for the LIKE lookups; every statement is idempotent. Substring filters cannot seek,
+# but with these the joins read narrow index b-trees instead of the Track/Album tables.
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS IX_Track_Album_Name ON Track (AlbumId, Name)",
+    "CREATE INDEX IF NOT EXISTS IX_Track_Name_Album ON Track (Name, AlbumId)",
+    "CREATE INDEX IF NOT EXISTS IX_Album_Artist_Title ON Album (ArtistId, Title)",
+    "CREATE INDEX IF NOT EXISTS IX_Album_Title_Artist ON Album (Title, ArtistId)",
+    "CREATE INDEX IF NOT EXISTS IX_Artist_Name ON Artist (Name)",
+]
+
+
+def query_shapes(qna: QNA) -> list[tuple[str, str, list]]:
+    """(name, query, params) for every filter combination of the lookup tools."""
+    builders = {"lookup_track": qna._track_query, "lookup_album": qna._album_query,
+                "lookup_artist": qna._artist_query}
+    shapes = []
+    for tool, build in builders.items():
+        for n in range(1, len(FILTER_KEYS) + 1):
+            for present in itertools.combinations(FILTER_KEYS, n):
+                filters = {key: "x" if key in present else None for key in FILTER_KEYS}
+                query, params, _ = build(filters)
+                shapes.append((f"{tool} [{', '.join(present)}]", query, params))
+    return shapes
+
+
+def explain(conn: sqlite3.Connection, query: str, params: list) -> list[str]:
+    """The EXPLAIN QUERY PLAN detail lines of a statement."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+def migrate(db_path: str):
+    """Create the covering indexes, refresh the planner statistics and print every plan before and after."""
+    qna = QNA(db_path, pool_size=1, fts=False, fuzzy=False, cache_size=0)
+    try:
+        shapes = query_shapes(qna)
+    finally:
+        qna.close()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        before = [explain(conn, query, params) for _, query, params in shapes]
+
+        with conn:
+            for statement in INDEXES:
+                conn.execute(statement)
+            conn.execute("ANALYZE")
+
+        for (name, query, params), old_plan in zip(shapes, before):
+            new_plan = explain(conn, query, params)
+            print(f"== {name}")
+            print("  before:")
+            for line in old_plan:
+                print(f"    {line}")
+            print("  after:")
+            for line in new_plan:
+                print(f"    {line}")
+        print(f"Created or verified {len(INDEXES)} indexes and analyzed {db_path}")
+    finally:
+        conn.close()
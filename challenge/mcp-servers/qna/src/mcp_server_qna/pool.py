@@ -0,0 +1,136 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class ConnectionPool:
+    """A bounded pool of long-lived read-only connections to the Chinook DB.
+
+    Connections are opened lazily up to `size` and handed back to the pool after
+    each lookup, so the schema and page cache stay warm between tool calls.
+    Extra read-only databases (e.g. the FTS sidecar) can be attached to every connection.
+    """
+
+    def __init__(self, db_path, size: int = 4, mmap_size: int = 256 * 1024 * 1024, cache_size_kib: int = 16 * 1024,
+                 attach: dict[str, str] | None = None):
+        if size < 1:
+            raise ValueError("pool size must be at least 1")
+        self.uri = self._ro_uri(db_path)
+        self.attach = {schema: self._ro_uri(path) for schema, path in (attach or {}).items()}
+        self.size = size
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._generation = 0
+        self._generations: dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+    @staticmethod
+    def _ro_uri(path) -> str:
+        return f"{Path(path).resolve().as_uri()}?mode=ro&immutable=1"
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        for schema, uri in self.attach.items():
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (uri,))
+        with self._lock:
+            self._generations[id(conn)] = self._generation
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        waited = False
+        while True:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+                    if not waited:
+                        self.misses += 1
+                elif not waited:
+                    self.waits += 1
+                    waited = True
+
+            if can_open:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            # Every connection is checked out: wait for one to be released (or retired by reset())
+            try:
+                return self._idle.get(timeout=0.05)
+            except queue.Empty:
+                continue
+
+    def release(self, conn: sqlite3.Connection):
+        with self._lock:
+            stale = self._generations.get(id(conn)) != self._generation
+        if stale:
+            self._discard(conn)
+        else:
+            self._idle.put_nowait(conn)
+
+    def _discard(self, conn: sqlite3.Connection):
+        conn.close()
+        with self._lock:
+            self._generations.pop(id(conn), None)
+            self._opened -= 1
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def reset(self):
+        """Retire every connection so the next lookups reopen the (changed) database files.
+
+        Immutable connections never notice changes made to the file, so this must be called
+        after the database is modified. Checked-out connections are closed when released.
+        """
+        with self._lock:
+            self._generation += 1
+        self.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.waits
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "idle": self._idle.qsize(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "hit_ratio": (self.hits + self.waits) / lookups if lookups else 0.0,
+            }
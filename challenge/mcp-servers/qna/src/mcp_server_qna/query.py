@@ -0,0 +1,85 @@
+from functools import lru_cache
+
+FILTER_KEYS = ("track_name", "album_title", "artist_name")
+
+# Every lookup row source starts with its sort key k0, followed by the value columns
+SELECTS = {
+    "lookup_track": "SELECT min(t.TrackId) as k0, t.Name as track_name, ar.Name as artist_name, al.Title as album_name",
+    "lookup_album": "SELECT al.AlbumId as k0, al.Title as album_name, ar.Name as artist_name",
+    "lookup_artist": "SELECT ar.ArtistId as k0, ar.Name as artist_name",
+}
+
+
+def shape(filters: dict[str, str | None]) -> tuple[str, ...]:
+    """The filter keys that have a value, in FILTER_KEYS order."""
+    return tuple(key for key in FILTER_KEYS if filters.get(key))
+
+
+def like_params(keys: tuple[str, ...], filters: dict[str, str | None]) -> list[str]:
+    return [f"%{filters[key]}%" for key in keys]
+
+
+@lru_cache(maxsize=3 * 2 ** len(FILTER_KEYS))
+def like_query(tool: str, present: tuple[str, ...]) -> tuple[str, tuple[str, ...]]:
+    """SQL of a LIKE lookup for one filter shape, plus the filter keys of its placeholders in order.
+
+    Album and artist lookups never join their child tables: filters on children become EXISTS
+    semi-joins, so a parent row is tested once instead of being fanned out to every track and
+    collapsed again. Track lookups need all three tables for their output and join them directly.
+    """
+    track = "track_name" in present
+    album = "album_title" in present
+    artist = "artist_name" in present
+    where, keys = [], []
+
+    if tool == "lookup_track":
+        source = """
+                FROM Track t
+                         JOIN Album al ON t.AlbumId = al.AlbumId
+                         JOIN Artist ar ON al.ArtistId = ar.ArtistId"""
+        for key, column in (("track_name", "t.Name"), ("album_title", "al.Title"), ("artist_name", "ar.Name")):
+            if key in present:
+                where.append(f"{column} LIKE ?")
+                keys.append(key)
+        group_by = " GROUP BY t.Name, ar.Name, al.Title"
+
+    elif tool == "lookup_album":
+        source = """
+                FROM Album al
+                         JOIN Artist ar ON al.ArtistId = ar.ArtistId"""
+        if album:
+            where.append("al.Title LIKE ?")
+            keys.append("album_title")
+        if artist:
+            where.append("ar.Name LIKE ?")
+            keys.append("artist_name")
+        if track:
+            where.append("EXISTS (SELECT 1 FROM Track t WHERE t.AlbumId = al.AlbumId AND t.Name LIKE ?)")
+            keys.append("track_name")
+        group_by = ""
+
+    elif tool == "lookup_artist":
+        source = """
+                FROM Artist ar"""
+        if artist:
+            where.append("ar.Name LIKE ?")
+            keys.append("artist_name")
+        if album or track:
+            albums = ["al.ArtistId = ar.ArtistId"]
+            if album:
+                albums.append("al.Title LIKE ?")
+                keys.append("album_title")
+            if track:
+                albums.append("EXISTS (SELECT 1 FROM Track t WHERE t.AlbumId = al.AlbumId AND t.Name LIKE ?)")
+                keys.append("track_name")
+            where.append(f"EXISTS (SELECT 1 FROM Album al WHERE {' AND '.join(albums)})")
+        group_by = ""
+
+    else:
+        raise ValueError(f"Unknown tool: {tool}")
+
+    query = f"""
+                {SELECTS[tool]}{source}
+                WHERE {' AND '.join(where) or '1 = 1'}{group_by} \
+                """
+    return query, tuple(keys)
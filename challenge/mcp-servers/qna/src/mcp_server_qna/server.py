@@ -1,5 +1,10 @@
+import base64
 import json
+import logging
+import os
 import sqlite3
+import threading
+import time
 from pathlib import Path
 from typing import Any
 from typing import List
@@ -7,156 +12,486 @@ from typing import List
 import mcp.types as types
 from mcp.server import InitializationOptions
 from mcp.server.lowlevel import Server, NotificationOptions
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 from mcp.server.stdio import stdio_server
 
+from .cache import ResultCache
+from .executor import DBExecutor
+from .fts import CatalogIndex
+from .fuzzy import TrigramIndex
+from .memory import CatalogSnapshot
+from .pool import ConnectionPool
+from .query import FILTER_KEYS, like_params, like_query, shape
+
+logger = logging.getLogger(__name__)
+
+STATS_URI = "qna://stats"
+CATALOG_URI = "qna://catalog"
+
+# Sizes and sums over the catalog tables: the same for every QNA process serving the same catalog, and
+# changes whenever answers drawn from it may have gone stale
+CATALOG_VERSION_QUERY = """
+    SELECT (SELECT count(*) || ':' || coalesce(max(ArtistId), 0) || ':' || total(length(Name)) FROM Artist),
+           (SELECT count(*) || ':' || coalesce(max(AlbumId), 0) || ':' || total(length(Title)) || ':' || total(ArtistId)
+            FROM Album),
+           (SELECT count(*) || ':' || coalesce(max(TrackId), 0) || ':' || total(length(Name)) || ':' || total(AlbumId)
+                       || ':' || total(length(Composer)) || ':' || total(GenreId) || ':' || total(UnitPrice)
+            FROM Track)"""
+
+BACKENDS = ("sqlite", "memory")
+
+LOOKUP_TOOLS = ("lookup_track", "lookup_album", "lookup_artist")
+
+BATCH_TOOLS = {
+    "lookup_tracks_batch": "lookup_track",
+    "lookup_albums_batch": "lookup_album",
+    "lookup_artists_batch": "lookup_artist",
+}
+MAX_BATCH_QUERIES = 50
+
+# Batch lookups hold a worker thread for much longer than single lookups
+DEFAULT_TOOL_CONCURRENCY = {batch_tool: 2 for batch_tool in BATCH_TOOLS}
+
+# Value columns of each lookup's row source, and how a row is rendered in the JSON output
+VALUE_COLUMNS = {
+    "lookup_track": ("track_name", "artist_name", "album_name"),
+    "lookup_album": ("album_name", "artist_name"),
+    "lookup_artist": ("artist_name",),
+}
+ROW_FORMATS = {
+    "lookup_track": lambda row: {"track_name": row[0], "artist_name": row[1], "album_name": row[2]},
+    "lookup_album": lambda row: {"album_name": row[0], "artist_name": row[1]},
+    "lookup_artist": lambda row: row[0],
+}
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+# Matches are counted up to this many; past it the total is only a lower bound
+TOTAL_COUNT_CAP = 1000
+
+PAGINATION_PROPERTIES = {
+    "limit": {"type": "integer", "minimum": 1, "maximum": MAX_LIMIT,
+              "description": f"maximum number of results to return (default {DEFAULT_LIMIT})"},
+    "cursor": {"type": "string",
+               "description": "next_cursor value from a previous call with the same filters, to get the next page"},
+}
+
 
 class QNA:
-    def __init__(self, db_path):
+    def __init__(self, db_path, pool_size: int = 4, fts: bool = True, fts_index_path: str | None = None,
+                 fuzzy: bool = True, backend: str = "sqlite", cache_size: int = 1024, cache_ttl: float = 300.0,
+                 change_check_interval: float = 1.0):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
         self.db_path = str(Path().resolve().joinpath(db_path))
+        self.backend = backend
+        self.index = CatalogIndex(self.db_path, fts_index_path)
+        # The memory backend never queries SQLite after loading, so it has no use for the FTS index
+        self.fts_enabled = fts and backend == "sqlite" and self.index.ensure()
+        attach = {"fts": self.index.index_path} if self.fts_enabled else None
+        self.pool = ConnectionPool(self.db_path, size=pool_size, attach=attach)
+        self.snapshot = None
+        if backend == "memory":
+            with self.pool.connection() as conn:
+                self.snapshot = CatalogSnapshot(conn)
+        self.fts_lookups = 0
+        self.like_lookups = 0
+        self.fuzzy_enabled = fuzzy
+        self.fuzzy_corrections = 0
+        if fuzzy:
+            self._build_stores()
+
+        self.cache = ResultCache(maxsize=cache_size, ttl=cache_ttl)
+        self.change_check_interval = change_check_interval
+        self._change_lock = threading.Lock()
+        # A plain (non-immutable) connection whose PRAGMA data_version moves when another connection commits
+        self._watch_conn = sqlite3.connect(f"{Path(self.db_path).as_uri()}?mode=ro", uri=True,
+                                           check_same_thread=False)
+        self._signature = self._db_signature()
+        self._checked_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "pool": self.pool.stats(),
+            "search": {"fts_enabled": self.fts_enabled, "fts": self.fts_lookups, "like": self.like_lookups},
+            "fuzzy": {"enabled": self.fuzzy_enabled, "corrections": self.fuzzy_corrections},
+            "cache": self.cache.stats(),
+            "query_shapes": like_query.cache_info()._asdict(),
+        }
+
+    def catalog_version(self) -> str:
+        with self.pool.connection() as conn:
+            return "|".join(conn.execute(CATALOG_VERSION_QUERY).fetchone())
+
+    def _db_signature(self) -> tuple:
+        stat = os.stat(self.db_path)
+        data_version = self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+        return stat.st_mtime_ns, stat.st_size, data_version
+
+    def _check_db_changed(self):
+        """Drop cached results and everything derived from the DB once its mtime or data_version moves."""
+        now = time.monotonic()
+        if now - self._checked_at < self.change_check_interval:
+            return
+        with self._change_lock:
+            self._checked_at = now
+            signature = self._db_signature()
+            if signature == self._signature:
+                return
+            logger.info("Chinook DB changed, refreshing caches and indexes")
+            self._signature = signature
+            self.cache.invalidate()
+            if self.fts_enabled:
+                self.fts_enabled = self.index.ensure()
+            self.pool.reset()
+            if self.snapshot is not None:
+                with self.pool.connection() as conn:
+                    self.snapshot = CatalogSnapshot(conn)
+            if self.fuzzy_enabled:
+                self._build_stores()
+
+    def lookup_batch(self, tool: str, args: dict[str, Any]) -> List[types.TextContent]:
+        """Run many filter sets of one lookup tool in a single call, answering repeated batches from the cache."""
+        if tool not in BATCH_TOOLS:
+            raise ValueError(f"Unknown tool: {tool}")
+        queries = args.get("queries") or []
+        if not isinstance(queries, list) or len(queries) > MAX_BATCH_QUERIES:
+            raise ValueError(f"'queries' must be a list of at most {MAX_BATCH_QUERIES} filter objects")
+        queries = [{key: (query or {}).get(key) for key in FILTER_KEYS} for query in queries]
+        limit = max(1, min(int(args.get("limit") or DEFAULT_LIMIT), MAX_LIMIT))
+        self._check_db_changed()
+        key = ResultCache.make_key(tool, {}, {"queries": queries, "limit": limit})
+        result = self.cache.get(key)
+        if result is None:
+            result = self._lookup_batch(BATCH_TOOLS[tool], queries, limit)
+            self.cache.put(key, result)
+        return result
+
+    def lookup(self, tool: str, args: dict[str, Any]) -> List[types.TextContent]:
+        """Run one of the lookup tools, answering repeated calls from the result cache."""
+        if tool not in LOOKUP_TOOLS:
+            raise ValueError(f"Unknown tool: {tool}")
+        filters = {key: args.get(key) for key in FILTER_KEYS}
+        page = {"limit": args.get("limit") or DEFAULT_LIMIT, "cursor": args.get("cursor")}
+        self._check_db_changed()
+        key = ResultCache.make_key(tool, filters, page)
+        result = self.cache.get(key)
+        if result is None:
+            result = getattr(self, f"_{tool}")(**filters, **page)
+            self.cache.put(key, result)
+        return result
+
+    def _build_stores(self):
+        """Load the track, album and artist names into trigram indexes for typo-tolerant lookups."""
+        with self.pool.connection() as conn:
+            self.track_store = TrigramIndex(row[0] for row in conn.execute("SELECT Name FROM Track"))
+            self.album_store = TrigramIndex(row[0] for row in conn.execute("SELECT Title FROM Album"))
+            self.artist_store = TrigramIndex(row[0] for row in conn.execute("SELECT Name FROM Artist"))
+
+    def _correct_filters(self, filters: dict[str, str | None]) -> dict[str, str | None] | None:
+        """Replace filter values that match no name at all with their closest trigram match.
+
+        Returns None if nothing could be corrected, so callers don't retry the same lookup.
+        """
+        if not self.fuzzy_enabled:
+            return None
+        stores = {"track_name": self.track_store, "album_title": self.album_store, "artist_name": self.artist_store}
+        corrected = dict(filters)
+        for key, value in filters.items():
+            if not value or stores[key].contains(value):
+                continue
+            best = stores[key].similarity_search(value, k=1)
+            if not best:
+                continue
+            corrected[key] = best[0][0]
+        if corrected == filters:
+            return None
+        self.fuzzy_corrections += 1
+        return corrected
+
+    def _match_query(self, key_columns: str, columns: str, id_column: str, group_by: str,
+                     filters: dict) -> tuple[str, list, int] | None:
+        """Build a MATCH query against the FTS catalog keyed by (rank, id), or None if the filters need the LIKE path."""
+        if not (self.fts_enabled and CatalogIndex.searchable(filters)):
+            self.like_lookups += 1
+            return None
+        self.fts_lookups += 1
+        query = f"""
+                SELECT min(rank) as k0, {key_columns} as k1, {columns}
+                FROM fts.catalog
+                WHERE catalog MATCH ?
+                  AND {id_column} IS NOT NULL
+                GROUP BY {group_by} \
+                """
+        return query, [CatalogIndex.match_expression(filters)], 2
+
+    def close(self):
+        self.pool.close()
+        self._watch_conn.close()
+
+    def _like_query(self, tool: str, filters: dict[str, str | None]) -> tuple[str, list, int]:
+        query, keys = like_query(tool, shape(filters))
+        return query, like_params(keys, filters), 1
+
+    def _track_query(self, filters: dict[str, str | None]) -> tuple[str, list, int]:
+        match = self._match_query(
+            "min(track_id)", "track_name, artist_name, album_title as album_name", "track_id",
+            "track_name, artist_name, album_title", filters)
+        return match or self._like_query("lookup_track", filters)
+
+    def _album_query(self, filters: dict[str, str | None]) -> tuple[str, list, int]:
+        if not filters.get("track_name"):
+            # The FTS table has a row per track: scanning the few album rows with LIKE is faster
+            self.like_lookups += 1
+            return self._like_query("lookup_album", filters)
+        match = self._match_query("album_id", "album_title as album_name, artist_name", "album_id", "album_id", filters)
+        return match or self._like_query("lookup_album", filters)
+
+    def _artist_query(self, filters: dict[str, str | None]) -> tuple[str, list, int]:
+        if not filters.get("track_name"):
+            self.like_lookups += 1
+            return self._like_query("lookup_artist", filters)
+        match = self._match_query("artist_id", "artist_name", "artist_id", "artist_id", filters)
+        return match or self._like_query("lookup_artist", filters)
+
+    def _page(self, tool: str, filters: dict[str, str | None], limit: int,
+              cursor: str | None) -> tuple[list[tuple], dict | None]:
+        """Fetch one keyset page of rows for a lookup tool.
+
+        Every row source yields its sort key in the leading `n_keys` columns; the page holds the rows
+        strictly after the cursor's key. Returns the rows without their key columns, plus pagination
+        metadata ({'next_cursor', 'total_count', 'total_count_is_lower_bound'}) if more rows follow.
+        """
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        after, total = decode_cursor(cursor) if cursor else (None, None)
+
+        if self.snapshot is not None:
+            rows = getattr(self.snapshot, tool)(**filters)
+            n_keys = 1
+            if total is None:
+                total = min(len(rows), TOTAL_COUNT_CAP)
+            if after is not None:
+                rows = [row for row in rows if list(row[:n_keys]) > after]
+            page = rows[:limit + 1]
+        else:
+            query, params, n_keys = getattr(self, f"_{tool.removeprefix('lookup_')}_query")(filters)
+            keys = ", ".join(f"k{i}" for i in range(n_keys))
+            with self.pool.connection() as conn:
+                paged = f"SELECT * FROM ({query})"
+                paged_params = list(params)
+                if after is not None:
+                    paged += f" WHERE ({keys}) > ({', '.join('?' * n_keys)})"
+                    paged_params += after
+                paged += f" ORDER BY {keys} LIMIT ?"
+                paged_params.append(limit + 1)
+                page = conn.execute(paged, paged_params).fetchall()
+                # Only counted when a first page does not hold every match
+                if total is None and len(page) > limit:
+                    total = conn.execute(
+                        f"SELECT count(*) FROM (SELECT 1 FROM ({query}) LIMIT {TOTAL_COUNT_CAP})", params
+                    ).fetchone()[0]
+
+        meta = None
+        if len(page) > limit:
+            page = page[:limit]
+            meta = {
+                "next_cursor": encode_cursor(list(page[-1][:n_keys]), total),
+                "total_count": total,
+                "total_count_is_lower_bound": total >= TOTAL_COUNT_CAP,
+            }
+        return [row[n_keys:] for row in page], meta
+
+    @staticmethod
+    def _content(results: list, meta: dict | None) -> List[types.TextContent]:
+        content = [types.TextContent(
+            type="text",
+            text=json.dumps(results)
+        )]
+        if meta:
+            content.append(types.TextContent(type="text", text=json.dumps(meta)))
+        return content
 
     def _lookup_track(
             self,
             track_name: str | None = None,
             album_title: str | None = None,
             artist_name: str | None = None,
+            limit: int = DEFAULT_LIMIT,
+            cursor: str | None = None,
     ) -> List[types.TextContent]:
         """Lookup a track in Chinook DB based on identifying information about.
 
         Returns:
-            a list of dictionaries per matching track that contain keys {'track_name', 'artist_name', 'album_name'}
+            a list of dictionaries per matching track that contain keys {'track_name', 'artist_name', 'album_name'},
+            followed by pagination metadata if more than `limit` tracks match
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        query = """
-                SELECT DISTINCT t.Name as track_name, ar.Name as artist_name, al.Title as album_name
-                FROM Track t
-                         JOIN Album al ON t.AlbumId = al.AlbumId
-                         JOIN Artist ar ON al.ArtistId = ar.ArtistId
-                WHERE 1 = 1 \
-                """
-        params = []
-
-        if track_name:
-            # track_name = track_store.similarity_search(track_name, k=1)[0].page_content
-            query += " AND t.Name LIKE ?"
-            params.append(f"%{track_name}%")
-        if album_title:
-            # album_title = album_store.similarity_search(album_title, k=1)[0].page_content
-            query += " AND al.Title LIKE ?"
-            params.append(f"%{album_title}%")
-        if artist_name:
-            # artist_name = artist_store.similarity_search(artist_name, k=1)[0].page_content
-            query += " AND ar.Name LIKE ?"
-            params.append(f"%{artist_name}%")
-
-        cursor.execute(query, params)
-        results = cursor.fetchall()
+        filters = {"track_name": track_name, "album_title": album_title, "artist_name": artist_name}
+        results, meta = self._page("lookup_track", filters, limit, cursor)
 
         tracks = [
             {"track_name": row[0], "artist_name": row[1], "album_name": row[2]}
             for row in results
         ]
 
-        conn.close()
-        return [types.TextContent(
-            type="text",
-            text=json.dumps(tracks)
-        )]
+        if not tracks and (corrected := self._correct_filters(filters)):
+            return self._lookup_track(**corrected, limit=limit, cursor=cursor)
+
+        return self._content(tracks, meta)
 
     def _lookup_album(
             self,
             track_name: str | None = None,
             album_title: str | None = None,
             artist_name: str | None = None,
+            limit: int = DEFAULT_LIMIT,
+            cursor: str | None = None,
     ) -> List[types.TextContent]:
         """Lookup an album in Chinook DB based on identifying information about.
 
         Returns:
-            a list of dictionaries per matching album that contain keys {'album_name', 'artist_name'}
+            a list of dictionaries per matching album that contain keys {'album_name', 'artist_name'},
+            followed by pagination metadata if more than `limit` albums match
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        query = """
-                SELECT DISTINCT al.Title as album_name, ar.Name as artist_name
-                FROM Album al
-                         JOIN Artist ar ON al.ArtistId = ar.ArtistId
-                         LEFT JOIN Track t ON t.AlbumId = al.AlbumId
-                WHERE 1 = 1 \
-                """
-        params = []
-
-        if track_name:
-            query += " AND t.Name LIKE ?"
-            params.append(f"%{track_name}%")
-        if album_title:
-            query += " AND al.Title LIKE ?"
-            params.append(f"%{album_title}%")
-        if artist_name:
-            query += " AND ar.Name LIKE ?"
-            params.append(f"%{artist_name}%")
-
-        cursor.execute(query, params)
-        results = cursor.fetchall()
+        filters = {"track_name": track_name, "album_title": album_title, "artist_name": artist_name}
+        results, meta = self._page("lookup_album", filters, limit, cursor)
 
         albums = [{"album_name": row[0], "artist_name": row[1]} for row in results]
 
-        conn.close()
-        return [types.TextContent(
-            type="text",
-            text=json.dumps(albums)
-        )]
+        if not albums and (corrected := self._correct_filters(filters)):
+            return self._lookup_album(**corrected, limit=limit, cursor=cursor)
+
+        return self._content(albums, meta)
 
     def _lookup_artist(
             self,
             track_name: str | None = None,
             album_title: str | None = None,
             artist_name: str | None = None,
+            limit: int = DEFAULT_LIMIT,
+            cursor: str | None = None,
     ) -> List[types.TextContent]:
         """Lookup an album in Chinook DB based on identifying information about.
 
         Returns:
-            a list of matching artist names
+            a list of matching artist names, followed by pagination metadata if more than `limit` artists match
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        query = """
-                SELECT DISTINCT ar.Name as artist_name
-                FROM Artist ar
-                         LEFT JOIN Album al ON al.ArtistId = ar.ArtistId
-                         LEFT JOIN Track t ON t.AlbumId = al.AlbumId
-                WHERE 1 = 1 \
-                """
-        params = []
-
-        if track_name:
-            query += " AND t.Name LIKE ?"
-            params.append(f"%{track_name}%")
-        if album_title:
-            query += " AND al.Title LIKE ?"
-            params.append(f"%{album_title}%")
-        if artist_name:
-            query += " AND ar.Name LIKE ?"
-            params.append(f"%{artist_name}%")
-
-        cursor.execute(query, params)
-        results = cursor.fetchall()
+        filters = {"track_name": track_name, "album_title": album_title, "artist_name": artist_name}
+        results, meta = self._page("lookup_artist", filters, limit, cursor)
 
         artists = [row[0] for row in results]
 
-        conn.close()
+        if not artists and (corrected := self._correct_filters(filters)):
+            return self._lookup_artist(**corrected, limit=limit, cursor=cursor)
+
+        return self._content(artists, meta)
+
+    def _batch_pages(self, tool: str, queries: list[dict], limit: int) -> list[tuple[list[tuple], dict | None]]:
+        """First pages of many lookups of one tool, fetched with a single UNION ALL statement."""
+        if self.snapshot is not None or len(queries) < 2:
+            return [self._page(tool, filters, limit, None) for filters in queries]
+
+        builder = getattr(self, f"_{tool.removeprefix('lookup_')}_query")
+        values = ", ".join(VALUE_COLUMNS[tool])
+        members, params = [], []
+        for i, filters in enumerate(queries):
+            query, query_params, n_keys = builder(filters)
+            keys = ", ".join(f"k{k}" for k in range(n_keys))
+            # Pad the key columns to two so every member of the compound select has the same shape
+            members.append(
+                f"SELECT {i} as q, {n_keys} as n_keys, k0, {'k1' if n_keys == 2 else 'NULL'} as k1, {values} "
+                f"FROM (SELECT * FROM ({query}) ORDER BY {keys} LIMIT ?)"
+            )
+            params += query_params + [limit + 1]
+        with self.pool.connection() as conn:
+            rows = conn.execute(" UNION ALL ".join(members) + " ORDER BY q, k0, k1", params).fetchall()
+
+        grouped = [[] for _ in queries]
+        for row in rows:
+            grouped[row[0]].append(row)
+        pages = []
+        for page in grouped:
+            meta = None
+            if len(page) > limit:
+                page = page[:limit]
+                n_keys = page[-1][1]
+                meta = {"next_cursor": encode_cursor(list(page[-1][2:2 + n_keys]), None)}
+            pages.append(([row[4:] for row in page], meta))
+        return pages
+
+    def _lookup_batch(self, tool: str, queries: list[dict], limit: int) -> List[types.TextContent]:
+        """Look up every filter set of `queries` with `tool`.
+
+        Returns:
+            a list with one entry per query, in order, holding the query, its (first page of) results in the
+            shape of the single lookup tool and a next_cursor if more results match
+        """
+        output = []
+        for filters, (results, meta) in zip(queries, self._batch_pages(tool, queries, limit)):
+            if not results and (corrected := self._correct_filters(filters)):
+                results, meta = self._page(tool, corrected, limit, None)
+            entry = {
+                "query": {key: value for key, value in filters.items() if value},
+                "results": [ROW_FORMATS[tool](row) for row in results],
+            }
+            if meta:
+                entry["next_cursor"] = meta["next_cursor"]
+            output.append(entry)
         return [types.TextContent(
             type="text",
-            text=json.dumps(artists)
+            text=json.dumps(output)
         )]
 
 
-async def main(db_path: str):
-    qna = QNA(db_path)
+def encode_cursor(after: list, total: int | None) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": after, "total": total}).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[list, int | None]:
+    """Returns the key to continue after and the total counted for the first page (None if it was never counted)."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        total = state.get("total")
+        return list(state["after"]), None if total is None else int(total)
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValueError("Invalid cursor")
+
+
+def create_executor(qna: QNA, db_workers: int | None = None,
+                    tool_concurrency: dict[str, int] | None = None) -> DBExecutor:
+    # One worker per pooled connection, so lookups never wait on the pool inside a worker thread
+    return DBExecutor(max_workers=db_workers or qna.pool.size,
+                      tool_limits={**DEFAULT_TOOL_CONCURRENCY, **(tool_concurrency or {})})
+
+
+def create_server(qna: QNA, executor: DBExecutor) -> Server:
+    """Build the QNA MCP server; the transport (stdio or streamable HTTP) is attached by the caller."""
     mcp = Server("qna")
 
+    @mcp.list_resources()
+    async def handle_list_resources() -> list[types.Resource]:
+        return [types.Resource(
+            uri=STATS_URI,
+            name="qna_stats",
+            description="Backend, connection pool, search, fuzzy matching, result cache and executor counters of the QNA server",
+            mimeType="application/json",
+        ), types.Resource(
+            uri=CATALOG_URI,
+            name="qna_catalog",
+            description="Version of the artist, album and track catalog the lookups answer from; changes whenever it does",
+            mimeType="text/plain",
+        )]
+
+    @mcp.read_resource()
+    async def handle_read_resource(uri) -> list[ReadResourceContents]:
+        if str(uri) == STATS_URI:
+            stats = {**qna.stats(), "executor": executor.stats()}
+            return [ReadResourceContents(content=json.dumps(stats), mime_type="application/json")]
+        if str(uri) == CATALOG_URI:
+            version = await executor.run("catalog", qna.catalog_version)
+            return [ReadResourceContents(content=version, mime_type="text/plain")]
+        raise ValueError(f"Unknown resource: {uri}")
+
     @mcp.list_tools()
     async def handle_list_tools() -> list[types.Tool]:
         ## TODO
@@ -170,6 +505,7 @@ async def main(db_path: str):
                     "track_name": {"type": "string", "description": "name of the track"},
                     "album_title": {"type": "string", "description": "title of the album"},
                     "artist_name": {"type": "string", "description": "name of the artist"},
+                    **PAGINATION_PROPERTIES,
                 },
                 "required": [],
             },
@@ -182,6 +518,7 @@ async def main(db_path: str):
                     "track_name": {"type": "string", "description": "name of the track"},
                     "album_title": {"type": "string", "description": "title of the album"},
                     "artist_name": {"type": "string", "description": "name of the artist"},
+                    **PAGINATION_PROPERTIES,
                 },
                 "required": [],
             },
@@ -194,53 +531,71 @@ async def main(db_path: str):
                     "track_name": {"type": "string", "description": "name of the track"},
                     "album_title": {"type": "string", "description": "title of the album"},
                     "artist_name": {"type": "string", "description": "name of the artist"},
+                    **PAGINATION_PROPERTIES,
                 }, "required": [],
             },
-        )]
+        ), *[types.Tool(
+            name=batch_tool,
+            description=f"Run several {tool} queries in one call. Returns one entry per query, in order, "
+                        f"each with the results {tool} would return",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "queries": {
+                        "type": "array",
+                        "maxItems": MAX_BATCH_QUERIES,
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "track_name": {"type": "string", "description": "name of the track"},
+                                "album_title": {"type": "string", "description": "title of the album"},
+                                "artist_name": {"type": "string", "description": "name of the artist"},
+                            },
+                        },
+                        "description": "filters of each lookup",
+                    },
+                    "limit": PAGINATION_PROPERTIES["limit"],
+                },
+                "required": ["queries"],
+            },
+        ) for batch_tool, tool in BATCH_TOOLS.items()]]
 
     @mcp.call_tool()
     async def handle_call_tool(name: str, args: dict[str, Any] | None):
         ## TODO
         ## implement tool calling logic
         try:
-            if name == "lookup_track":
-                if args is None:
-                    args = {}
-                return qna._lookup_track(
-                    track_name=args.get("track_name"),
-                    album_title=args.get("album_title"),
-                    artist_name=args.get("artist_name"),
-                )
-            elif name == "lookup_album":
-                if args is None:
-                    args = {}
-                return qna._lookup_album(
-                    track_name=args.get("track_name"),
-                    album_title=args.get("album_title"),
-                    artist_name=args.get("artist_name"),
-                )
-            elif name == "lookup_artist":
-                if args is None:
-                    args = {}
-                return qna._lookup_artist(
-                    track_name=args.get("track_name"),
-                    album_title=args.get("album_title"),
-                    artist_name=args.get("artist_name"),
-                )
+            if name in LOOKUP_TOOLS:
+                return await executor.run(name, qna.lookup, name, args or {})
+            elif name in BATCH_TOOLS:
+                return await executor.run(name, qna.lookup_batch, name, args or {})
             else:
                 raise ValueError(f"Unknown tool: {name}")
         except Exception as e:
             return [types.TextContent(type="text", text=f"Error: {str(e)}")]
 
-    async with stdio_server() as (read_stream, write_stream):
-        await mcp.run(read_stream, write_stream, InitializationOptions(
-            server_name="qna",
-            server_version="0.1.0",
-            capabilities=mcp.get_capabilities(
-                notification_options=NotificationOptions(),
-                experimental_capabilities={},
-            ),
-        ), raise_exceptions=True)
+    return mcp
+
+
+async def main(db_path: str, db_workers: int | None = None, tool_concurrency: dict[str, int] | None = None,
+               **options):
+    qna = QNA(db_path, **options)
+    executor = create_executor(qna, db_workers, tool_concurrency)
+    mcp = create_server(qna, executor)
+
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await mcp.run(read_stream, write_stream, InitializationOptions(
+                server_name="qna",
+                server_version="0.1.0",
+                capabilities=mcp.get_capabilities(
+                    notification_options=NotificationOptions(),
+                    experimental_capabilities={},
+                ),
+            ), raise_exceptions=True)
+    finally:
+        executor.shutdown()
+        qna.close()
 
 
 class ServerWrapper():
@@ -0,0 +1,61 @@
+import contextlib
+import logging
+from collections.abc import AsyncIterator
+
+import uvicorn
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from starlette.types import Receive, Scope, Send
+
+from .server import QNA, create_executor, create_server
+
+logger = logging.getLogger(__name__)
+
+
+def main(db_path: str, host: str = "127.0.0.1", port: int = 8001, db_workers: int | None = None,
+         tool_concurrency: dict[str, int] | None = None, **options):
+    """Serve QNA over streamable HTTP, so one warm instance (pool, caches, indexes) is shared by every client."""
+    qna = QNA(db_path, **options)
+    executor = create_executor(qna, db_workers, tool_concurrency)
+    mcp = create_server(qna, executor)
+
+    # Create the session manager with true stateless mode
+    session_manager = StreamableHTTPSessionManager(
+        app=mcp,
+        event_store=None,
+        json_response=True,
+        stateless=True,
+    )
+
+    async def handle_streamable_http(
+            scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        await session_manager.handle_request(scope, receive, send)
+
+    async def handle_stats(request: Request) -> JSONResponse:
+        return JSONResponse({**qna.stats(), "executor": executor.stats()})
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+        """Context manager for session manager."""
+        async with session_manager.run():
+            logger.info("QNA server started with StreamableHTTP session manager!")
+            try:
+                yield
+            finally:
+                logger.info("QNA server shutting down...")
+                executor.shutdown()
+                qna.close()
+
+    starlette_app = Starlette(
+        routes=[
+            Mount("/mcp", app=handle_streamable_http),
+            Route("/stats", endpoint=handle_stats),
+        ],
+        lifespan=lifespan,
+    )
+
+    uvicorn.run(starlette_app, host=host, port=port)
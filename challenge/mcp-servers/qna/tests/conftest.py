@@ -0,0 +1,37 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from mcp_server_qna.server import QNA
+
+CHINOOK_DB = Path(__file__).resolve().parents[1] / "data" / "chinook.db"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A copy of the Chinook DB the test may write to."""
+    path = tmp_path / "chinook.db"
+    shutil.copyfile(CHINOOK_DB, path)
+    return path
+
+
+@pytest.fixture
+def make_qna(db_path):
+    """Open QNA instances on the test's DB copy, closed at teardown."""
+    opened = []
+
+    def make(**kwargs):
+        qna = QNA(db_path, **kwargs)
+        opened.append(qna)
+        return qna
+
+    yield make
+    for qna in opened:
+        qna.close()
+
+
+def decode(content) -> tuple[list, dict | None]:
+    """The results of a lookup tool call and its pagination metadata, if any."""
+    return json.loads(content[0].text), json.loads(content[1].text) if len(content) > 1 else None
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from mcp_server_qna.server import BATCH_TOOLS, MAX_BATCH_QUERIES
+
+from conftest import decode
+from test_pagination import BACKENDS, walk
+
+QUERIES = [
+    {"artist_name": "Iron Maiden"},
+    {"track_name": "Highway to Hell"},
+    {"artist_name": "AC/DC", "album_title": "Let There Be Rock"},
+    {"album_title": "Zzyzx Nothing Matches"},
+    {"track_name": "love"},
+]
+
+
+@pytest.mark.parametrize("options", BACKENDS)
+@pytest.mark.parametrize("batch_tool, tool", BATCH_TOOLS.items())
+def test_batch_matches_single_lookups(make_qna, options, batch_tool, tool):
+    qna = make_qna(**options)
+    entries = json.loads(qna.lookup_batch(batch_tool, {"queries": QUERIES, "limit": 10})[0].text)
+
+    assert [entry["query"] for entry in entries] == QUERIES
+    for query, entry in zip(QUERIES, entries):
+        results, meta = decode(qna.lookup(tool, {**query, "limit": 10}))
+        assert entry["results"] == results
+        assert ("next_cursor" in entry) == (meta is not None)
+        if meta is not None:
+            # A batch cursor continues with the single lookup tool
+            continued, cursor = list(entry["results"]), entry["next_cursor"]
+            while cursor is not None:
+                page, meta = decode(qna.lookup(tool, {**query, "limit": 200, "cursor": cursor}))
+                continued += page
+                cursor = meta and meta["next_cursor"]
+            assert continued == walk(qna, tool, query, limit=200)[0]
+
+
+def test_batch_size_is_bounded(make_qna):
+    qna = make_qna()
+    with pytest.raises(ValueError):
+        qna.lookup_batch("lookup_tracks_batch", {"queries": [{"track_name": "love"}] * (MAX_BATCH_QUERIES + 1)})
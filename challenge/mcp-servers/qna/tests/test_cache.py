@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+from mcp_server_qna.cache import ResultCache
+
+from conftest import decode
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = ResultCache(ttl=10.0, clock=clock)
+    cache.put("key", "value")
+    clock.now = 9.9
+    assert cache.get("key") == "value"
+    clock.now = 10.0
+    assert cache.get("key") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_key_ignores_case_and_unset_filters_but_not_cursor():
+    key = ResultCache.make_key("lookup_track", {"artist_name": "AC/DC", "track_name": None}, {"cursor": "abc"})
+    assert key == ResultCache.make_key("lookup_track", {"artist_name": "ac/dc", "track_name": ""}, {"cursor": "abc"})
+    assert key != ResultCache.make_key("lookup_track", {"artist_name": "AC/DC"}, {"cursor": "ABC"})
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "memory"])
+def test_cached_results_are_dropped_when_the_db_changes(make_qna, db_path, backend):
+    qna = make_qna(backend=backend, change_check_interval=3600)
+    args = {"artist_name": "Zzyzx Quartet"}
+    assert "Zzyzx Quartet" not in decode(qna.lookup("lookup_artist", args))[0]
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("INSERT INTO Artist (Name) VALUES ('Zzyzx Quartet')")
+    conn.close()
+
+    # Still within the check interval: answered from the cache
+    assert "Zzyzx Quartet" not in decode(qna.lookup("lookup_artist", args))[0]
+    assert qna.cache.stats()["hits"] == 1
+
+    qna.change_check_interval = 0
+    assert decode(qna.lookup("lookup_artist", args))[0] == ["Zzyzx Quartet"]
+    assert qna.cache.stats()["invalidations"] == 1
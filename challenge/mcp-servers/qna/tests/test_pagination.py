@@ -0,0 +1,75 @@
+import pytest
+
+from conftest import decode
+
+BACKENDS = [
+    pytest.param({"backend": "sqlite"}, id="fts"),
+    pytest.param({"backend": "sqlite", "fts": False}, id="like"),
+    pytest.param({"backend": "memory"}, id="memory"),
+]
+
+LOOKUPS = [
+    ("lookup_track", {"artist_name": "Iron Maiden"}),
+    ("lookup_album", {"artist_name": "the"}),
+    ("lookup_artist", {"artist_name": "the"}),
+]
+
+
+def walk(qna, tool, filters, limit) -> tuple[list, list[dict | None]]:
+    """Every result of a lookup, following next_cursor page by page, and the metadata of each page."""
+    results, metas = [], []
+    cursor = None
+    while True:
+        page, meta = decode(qna.lookup(tool, {**filters, "limit": limit, "cursor": cursor}))
+        results += page
+        metas.append(meta)
+        if meta is None:
+            return results, metas
+        cursor = meta["next_cursor"]
+
+
+@pytest.mark.parametrize("options", BACKENDS)
+@pytest.mark.parametrize("tool, filters", LOOKUPS)
+def test_cursor_round_trip_returns_every_result_once(make_qna, options, tool, filters):
+    qna = make_qna(**options)
+    results, metas = walk(qna, tool, filters, limit=7)
+
+    assert len(metas) > 1, "the first page must not hold the whole result"
+    assert len(results) == len(set(map(repr, results)))
+    assert all(meta["total_count"] == len(results) for meta in metas[:-1])
+    assert not metas[0]["total_count_is_lower_bound"]
+    # Page boundaries do not change what is returned, or in which order
+    assert walk(qna, tool, filters, limit=200)[0] == results
+
+
+@pytest.mark.parametrize("options", BACKENDS)
+def test_pages_match_the_catalog(make_qna, db_path, options):
+    qna = make_qna(**options)
+    results, _ = walk(qna, "lookup_track", {"artist_name": "Iron Maiden"}, limit=50)
+
+    with qna.pool.connection() as conn:
+        expected = conn.execute(
+            """
+            SELECT DISTINCT t.Name, ar.Name, al.Title
+            FROM Track t
+                     JOIN Album al ON t.AlbumId = al.AlbumId
+                     JOIN Artist ar ON al.ArtistId = ar.ArtistId
+            WHERE ar.Name LIKE '%Iron Maiden%'
+            """
+        ).fetchall()
+    assert len(results) > 200
+    assert sorted((r["track_name"], r["artist_name"], r["album_name"]) for r in results) == sorted(expected)
+
+
+@pytest.mark.parametrize("options", BACKENDS)
+def test_result_within_one_page_has_no_pagination_metadata(make_qna, options):
+    qna = make_qna(**options)
+    albums, meta = decode(qna.lookup("lookup_album", {"artist_name": "AC/DC"}))
+    assert len(albums) == 2
+    assert meta is None
+
+
+def test_invalid_cursor_is_rejected(make_qna):
+    qna = make_qna()
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        qna.lookup("lookup_track", {"artist_name": "Iron Maiden", "cursor": "not a cursor"})